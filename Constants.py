@@ -18,6 +18,10 @@ import os
 HEADDIR = os.path.expanduser("~/Data")
 STATUTEDIR = os.path.join(HEADDIR,"Statutes")  #where statute xml bundles are found
 PAGEDIR = os.path.join(HEADDIR,"Pages")  #where the output wikipage should be stored
+MEDIAWIKIPAGEDIR = os.path.join(HEADDIR,"MediaWikiPages") #where MediaWiki pages are stored, when rendering in several formats at once (see RenderContext.MultiContext)
+WIKIPAGEDIR = os.path.join(HEADDIR,"WikiPages") #where Wikidot pages are stored, likewise
+PAGEARCHIVEFILE = None #if set (e.g., to os.path.join(HEADDIR,"pages.sqlite")), test.py stores the pages in this single file instead of PAGEDIR (see PageArchive)
+ERRORLOGFILE = None #if set (e.g., to os.path.join(HEADDIR,"errors.jsonl")), test.py writes its warnings to this file as JSONL instead of to stderr (see ErrorReporter.ErrorCollector)
 LIBRARYDIR = os.path.join(HEADDIR,"XMLLibs") #where compile c modules will be located
 STATUTEDATADIR = os.path.join(HEADDIR, "StatuteData") #directory for information about statutes, used by StatuteIndex
 RAWXMLDIR = os.path.join(HEADDIR,"RawXML")
@@ -26,6 +30,7 @@ RAWXMLDIR = os.path.join(HEADDIR,"RawXML")
 STATUTECONFIGFILE = "stat_config.txt"
 #TODO: implement logging old statutes
 OLDSTATUTEDIR = os.path.join(HEADDIR, "OldStatutes") #directory that stores old versions of statutes
+INDEXDBFILE = None #if set (e.g., to os.path.join(STATUTEDATADIR,"indices.sqlite")), statute indices are also stored in and queried from this SQLite database (see StatuteIndexDB)
 
 
 #top level tags for ordinary sections handled by SectionItem (other than in formulas)
@@ -21,29 +21,29 @@
 
 from ErrorReporter import showError
 from StatutePart import StatutePart
+import bisect
 
 class DecoratorException(Exception): pass
 
 class DecoratedText(StatutePart):
     def __init__(self,parent,text,decorators=None):
-        """Initializer for Decorated Text."""
+        """Initializer for Decorated Text.  The decorators are kept in order of their start positions (they never overlap), with a parallel list of start positions for bisection."""
         StatutePart.__init__(self,parent=parent)
         self.text=text
         self.decorators = []
+        self.decoratorStarts = [] #start position of each decorator in self.decorators
         if decorators is not None:
             for d in decorators: self.addDecorator(d) #add each of the given decorators, if specified
         return
     def addDecorator(self,decorator):
         """Adds a decorator for this Text."""
-        n = 0
         #attach decorator to this text
-
-        #find the first decorator that this one starts after / find the point were this decorator would be inserted
         decorator.attachToDecoratedText(self)
-        insertPoint = len(self.decorators)
-        for n in xrange(0,len(self.decorators)):
-            if self.decorators[n].getEnd() > decorator.getStart(): insertPoint = n; break
-            pass
+
+        #find the point were this decorator would be inserted -- the first decorator ending after this one starts.  Since decorators do not overlap, this is either the last decorator starting at or before this one, or the one following it.
+        start = decorator.getStart()
+        insertPoint = bisect.bisect_right(self.decoratorStarts,start)
+        if insertPoint > 0 and self.decorators[insertPoint-1].getEnd() > start: insertPoint -= 1
 
         if insertPoint < len(self.decorators) and self.decorators[insertPoint].collide(decorator): #if inserting at the point of existing decorator, and there is an overlap, show error and return
 
@@ -53,9 +53,10 @@ class DecoratedText(StatutePart):
                 oldDec = self.decorators[insertPoint]
                 #if abs(decorator.getStart()-oldDec.getStart())< 2 and oldDec.getEnd() > decorator.getEnd(): pass #ignore collisions if new decorator is a subset of old.
                 if decorator.getStart()>=oldDec.getStart() and oldDec.getEnd() >= decorator.getEnd(): pass #ignore collisions if new decorator is a subset of old.
-                else: showError( "Decorator collision, old:[" + self.getDText(self.decorators[insertPoint]) + "], new:[" + self.getDText(decorator) +"]" ,location=self)
+                else: showError("Decorator collision, old:[%s], new:[%s]",location=self,category="decoratorCollision",args=(self.getDText(oldDec),self.getDText(decorator)))
             return
         self.decorators.insert(insertPoint,decorator) #insert decorator at appropriate sport
+        self.decoratorStarts.insert(insertPoint,start)
         return
     def getText(self):
         """Returns the raw text underlying the DecoratedText."""
@@ -66,8 +67,7 @@ class DecoratedText(StatutePart):
         @rtype: str"""
         return self.text[decorator.getStart():decorator.getEnd()]
     def getRenderedText(self, renderContext):
-        """Returns the items text, with the Decorator objects applied to the applicable portions."""
-        self.decorators.sort()
+        """Returns the items text, with the Decorator objects applied to the applicable portions.  addDecorator keeps self.decorators in order, so no sorting is needed."""
         ptr = 0
         textList = []
         for dec in self.decorators:
@@ -77,7 +77,7 @@ class DecoratedText(StatutePart):
             ptr = dec.getEnd()
             pass
         textList.append(self.text[ptr:])
-        return u"".join(textList)
+        return renderContext.joinText(textList)
     def getDefinedTerms(self):
         """Returns a list of defined terms in the DecoratedText.
         @rtype: list of str
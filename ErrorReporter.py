@@ -13,7 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import sys
+import sys, json
 
 class StrictException(Exception): pass
 
@@ -27,23 +27,103 @@ ENDC = '\033[0m'
 errorCount = 0
 
 STRICT = False #set to True to force an exception upon any warning message.
-def showError(s, header = "WARNING", location = None,color=None):
-    global errorCount
-    if location is not None:
-        while True:
-            if hasattr(location, "getSectionLabel"): #work our way up the parent chain till we find something with a getSectionLabel that returns non-None           
-                if location.getSectionLabel() is not None:
-                    s += "@<" + location.getSectionLabel().getIDString() + ">"
-                    #s += "@<" + location.getLocationString() + ">"
-                    break
-                pass
-            if not hasattr(location, "parent"): break
-            location = location.parent 
+collector = None #if set to an ErrorCollector, messages are recorded in it (and written out when it is flushed), instead of being written to stderr as they occur
+
+def getLocationString(location):
+    """Returns the "@<label>" suffix for a message about location, using the first object up its parent chain whose getSectionLabel returns non-None, or "" if there is none."""
+    while location is not None:
+        getSectionLabel = getattr(location, "getSectionLabel", None)
+        if getSectionLabel is not None:
+            sL = getSectionLabel()
+            if sL is not None: return "@<" + sL.getIDString() + ">"
             pass
+        location = getattr(location, "parent", None)
         pass
-    if STRICT: raise StrictException(s)
+    return ""
+
+def formatMessage(template, args):
+    """Returns the message template, filled in with args (if not None)."""
+    if args is None: return template
+    return template % args
+
+def writeMessage(f, number, header, message, color=None):
+    if color is not None: f.write(FAIL)
+    f.write(("[% 5d]"%number) + header + ": <" + message + ">\n")
+    if color is not None: f.write(ENDC)
+    return
+
+def showError(s, header = "WARNING", location = None,color=None,category=None,args=None):
+    """Reports a problem.  If args is given, s is a template, filled in as s % args only when the message is written; the location (an item or other object with a parent chain) is likewise only resolved to a section label when the message is written.  The category (by default, the header) groups messages for the counts, suppression and sampling of an ErrorCollector."""
+    global errorCount
+    if STRICT: raise StrictException(formatMessage(s,args) + getLocationString(location))
+    if collector is not None:
+        errorCount += 1
+        collector.record(errorCount, header, category if category is not None else header, s, args, location, color)
     else:
-        if color is not None: sys.stderr.write(FAIL)
+        message = formatMessage(s,args) + getLocationString(location) #resolved before the message is numbered, in case resolving it reports another
         errorCount += 1
-        sys.stderr.write(("[% 5d]"%errorCount) + header + ": <" + s + ">\n")
-        if color is not None: sys.stderr.write(ENDC)
\ No newline at end of file
+        writeMessage(sys.stderr, errorCount, header, message, color)
+        pass
+    return
+
+class ErrorCollector(object):
+    """Collects the messages passed to showError during a run, so that they can be written out at the end, as a list or as a JSONL log, with a summary of the counts in each category.
+    Messages are recorded without being formatted; a message's location is resolved when it is written, so it reflects the final section label of the location object.  The messages in a category can be suppressed (only counted) or sampled (only one in every so many recorded)."""
+    def __init__(self):
+        self.messages = [] #recorded messages, as (number, header, category, template, args, location, color)
+        self.counts = {} #number of messages seen in each category
+        self.recordedCounts = {} #number of messages recorded in each category
+        self.suppressed = set() #categories that are counted but not recorded
+        self.sampleRates = {} #category -> n, where one in every n messages of the category is recorded
+        return
+    def suppress(self, *categories):
+        """Only counts the messages in the given categories."""
+        self.suppressed.update(categories)
+        return
+    def sample(self, category, rate):
+        """Records only the first message in category, and one in every rate messages after it."""
+        self.sampleRates[category] = rate
+        return
+    def record(self, number, header, category, template, args, location, color=None):
+        count = self.counts.get(category, 0) + 1
+        self.counts[category] = count
+        if category in self.suppressed: return
+        rate = self.sampleRates.get(category)
+        if rate is not None and (count - 1) % rate != 0: return
+        self.recordedCounts[category] = self.recordedCounts.get(category, 0) + 1
+        self.messages.append((number, header, category, template, args, location, color))
+        return
+    def popMessages(self):
+        """Removes the recorded messages, and returns them as (number, header, category, message, location string, color).  Any messages shown while the locations are resolved are recorded afresh."""
+        messages = self.messages
+        self.messages = []
+        return [(number, header, category, formatMessage(template, args), getLocationString(location), color) for number, header, category, template, args, location, color in messages]
+    def writeMessages(self, f=None):
+        """Writes the recorded messages, in the format showError uses when there is no collector."""
+        if f is None: f = sys.stderr
+        for number, header, category, message, locationString, color in self.popMessages(): writeMessage(f, number, header, message + locationString, color)
+        return
+    def writeLog(self, fname):
+        """Writes the recorded messages to fname as JSONL: one JSON object (number, header, category, message, location) per line."""
+        f = open(fname, "w")
+        for number, header, category, message, locationString, color in self.popMessages():
+            f.write(json.dumps({"number": number, "header": header, "category": category, "message": message, "location": locationString[2:-1]}) + "\n")
+            pass
+        f.close()
+        return
+    def writeSummary(self, f=None):
+        """Writes the number of messages seen, and recorded, in each category."""
+        if f is None: f = sys.stderr
+        f.write("%-30s %8s %8s\n" % ("category", "count", "recorded"))
+        for category in sorted(self.counts, key=lambda c: -self.counts[c]):
+            f.write("%-30s %8d %8d\n" % (category, self.counts[category], self.recordedCounts.get(category, 0)))
+            pass
+        return
+    def flush(self, logName=None):
+        """Writes the recorded messages, to stderr, or to a JSONL log if logName is given, followed by the summary of counts, and then starts afresh."""
+        if logName is not None: self.writeLog(logName)
+        else: self.writeMessages()
+        self.writeSummary()
+        self.counts = {}
+        self.recordedCounts = {}
+        return
@@ -0,0 +1,57 @@
+# Copyright (C) 2022  Ian Caines
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""HTTP server on the local interface, shared by StatuteServer and StatuteService.  Connections are kept alive between requests (HTTP/1.1), and each connection is handled in its own thread."""
+
+import threading, BaseHTTPServer, SocketServer
+
+class LocalRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" #keep connections alive, so clients can reuse them
+    def sendData(self,data,contentType,headers=[]):
+        self.send_response(200)
+        self.send_header("Content-Type",contentType)
+        self.send_header("Content-Length",str(len(data)))
+        for header, value in headers: self.send_header(header,value)
+        self.end_headers()
+        self.wfile.write(data)
+        return
+    def log_message(self,format,*args):
+        if self.server.verbose: BaseHTTPServer.BaseHTTPRequestHandler.log_message(self,format,*args)
+        return
+    pass
+
+class LocalServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Server (on the local interface only) answering requests with handlerClass.  If port is 0, a free port is chosen (see getPort)."""
+    daemon_threads = True
+    allow_reuse_address = True
+    def __init__(self,handlerClass,port=0,verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self,("127.0.0.1",port),handlerClass)
+        self.verbose = verbose
+        self.thread = None
+        return
+    def getPort(self): return self.server_address[1]
+    def start(self):
+        """Starts serving in a background thread."""
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return
+    def stop(self):
+        """Stops a server started with start."""
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+        return
+    pass
@@ -0,0 +1,129 @@
+# Copyright (C) 2022  Ian Caines
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Module for storing rendered pages in a single SQLite file, instead of one file per page.
+
+A PageArchive can be given to Statute.renderPages in place of a RenderContext.PageQueue: each page is then stored in the archive when its PageWriter is closed, and the pages of a statute are committed in one transaction when renderPages finishes.  Pages are stored under their path relative to the archive's base directory (by default HEADDIR, so that pages from PAGEDIR are stored as, e.g., "Pages/apca 1.html").  Rendering a statute again replaces all its pages: renderPages calls startStatute, which deletes the pages stored for the statute before, so pages of sections that have since been repealed or renumbered are not kept.  If rendering fails, renderPages calls abort, and the pages stored before are kept.
+
+Table:
+pages - (name, compression, length, data, statute), where data is the page, compressed with zlib unless compression is StatuteFetch.NOCOMPRESSION, length is its uncompressed length, and statute is the page prefix of the statute the page was rendered for (or NULL, for pages stored without startStatute).
+
+Usage: python PageArchive.py archive [directory]
+Extracts every page in the archive to the same layout of files under directory (by default HEADDIR).  With "-l" in place of the directory, lists the pages instead.
+"""
+
+import sys, os, time, sqlite3, zlib
+import Constants, StatuteFetch
+
+class PageArchiveException(Exception): pass
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (name TEXT PRIMARY KEY, compression INTEGER, length INTEGER, data BLOB, statute TEXT);
+CREATE INDEX IF NOT EXISTS pagesByStatute ON pages (statute);
+"""
+
+class PageArchive(object):
+    """Connection to a page archive, which is created if it does not exist."""
+    def __init__(self,fname,baseDir=None,compression=StatuteFetch.ZLIBCOMPRESSION):
+        self.fname = fname
+        if baseDir is None: baseDir = Constants.HEADDIR
+        self.baseDir = baseDir
+        self.compression = compression
+        try:
+            self.connection = sqlite3.connect(fname)
+            self.connection.text_factory = str
+            if "statute" not in [row[1] for row in self.connection.execute("PRAGMA table_info(pages)")] and self.connection.execute("SELECT name FROM sqlite_master WHERE name='pages'").fetchone() is not None:
+                self.connection.execute("ALTER TABLE pages ADD COLUMN statute TEXT") #archive created before pages were recorded by statute
+                pass
+            self.connection.executescript(SCHEMA)
+        except sqlite3.Error, e:
+            raise PageArchiveException("Could not open page archive " + fname + ": " + str(e))
+        self.statute = None #page prefix of the statute whose pages are being stored (see startStatute)
+        self.pageCount = 0 #number of pages stored
+        self.stallTime = 0.0 #time spent storing pages (during which rendering waits)
+        self.writeTime = 0.0 #likewise, including commits
+        return
+    def getPageName(self,path):
+        """Returns the name under which the page at path is stored."""
+        return os.path.relpath(path,self.baseDir).replace(os.sep,"/")
+    def startStatute(self,prefix):
+        """Deletes the pages stored for the statute with page prefix prefix, and records the pages stored until the next startStatute as belonging to it.  Called by Statute.renderPages, so that the pages rendered replace all those rendered before; the deletion is committed with them, by the next flush."""
+        self.statute = prefix
+        self.connection.execute("DELETE FROM pages WHERE statute=?", (prefix,))
+        return
+    def put(self,path,pieces):
+        """Stores the page with the given (encoded) pieces, as the page at path.  The page is committed by the next flush."""
+        start = time.time()
+        data = "".join(pieces)
+        length = len(data)
+        if self.compression == StatuteFetch.ZLIBCOMPRESSION: data = zlib.compress(data)
+        self.connection.execute("INSERT OR REPLACE INTO pages VALUES (?,?,?,?,?)", (self.getPageName(path),self.compression,length,sqlite3.Binary(data),self.statute))
+        self.pageCount += 1
+        elapsed = time.time() - start
+        self.stallTime += elapsed
+        self.writeTime += elapsed
+        return
+    def flush(self):
+        """Commits the pages stored since the last flush."""
+        start = time.time()
+        self.connection.commit()
+        self.writeTime += time.time() - start
+        return
+    def abort(self):
+        """Discards the pages stored (and deleted by startStatute) since the last flush.  Called by Statute.renderPages if rendering fails, so that the statute's previous pages are kept rather than being replaced by part of its new ones."""
+        self.connection.rollback()
+        self.statute = None
+        return
+    def finish(self):
+        """Commits any stored pages, and closes the archive."""
+        self.flush()
+        self.connection.close()
+        return
+    def getPageNames(self):
+        return [row[0] for row in self.connection.execute("SELECT name FROM pages ORDER BY name")]
+    def getPage(self,name):
+        """Returns the (encoded) page stored under name, or None if there is none."""
+        row = self.connection.execute("SELECT compression, data FROM pages WHERE name=?", (name,)).fetchone()
+        if row is None: return None
+        compression, data = row
+        if compression == StatuteFetch.ZLIBCOMPRESSION: return zlib.decompress(data)
+        return str(data)
+    def extract(self,directory=None):
+        """Writes every page to its file under directory (by default the base directory), creating directories as needed.  Returns the number of pages written."""
+        if directory is None: directory = self.baseDir
+        count = 0
+        for name, compression, data in self.connection.execute("SELECT name, compression, data FROM pages"):
+            path = os.path.join(directory,*name.split("/"))
+            if not os.path.isdir(os.path.dirname(path)): os.makedirs(os.path.dirname(path))
+            if compression == StatuteFetch.ZLIBCOMPRESSION: data = zlib.decompress(data)
+            f = open(path,"wb")
+            f.write(data)
+            f.close()
+            count += 1
+            pass
+        return count
+    pass
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2,3): print("Usage: python PageArchive.py archive [directory | -l]"); sys.exit(1)
+    if not os.path.exists(sys.argv[1]): print("No such archive: " + sys.argv[1]); sys.exit(1)
+    archive = PageArchive(sys.argv[1])
+    if len(sys.argv) == 3 and sys.argv[2] == "-l":
+        for name in archive.getPageNames(): print(name)
+    else:
+        directory = sys.argv[2] if len(sys.argv) == 3 else None
+        print("%d pages extracted" % archive.extract(directory))
+        pass
+    archive.finish()
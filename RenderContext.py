@@ -6,15 +6,195 @@
 
 #TODO: clean up the rendering methods that are provided, some are no longer needed with the current parser
 
-import re, os
+import re, os, time, threading, Queue
 import urllib
 import Constants
 
 badStrings = [("&#8217;","'"),("&#8220;","\""),("&#8221;","\""),("&#8212;","--")]
 
+PAGEBUFFERSIZE = 1 << 16 #size of the write buffer for page files
+PAGEQUEUESIZE = 64 #number of rendered pages that can wait to be written by a PageQueue
+ANCHORCACHESIZE = 1 << 15 #number of recently encoded anchors kept by an AnchorCache (up to twice this many are held)
+
 #these characters don't need to be corrected, now that we're using utf-8 encoding on the html pages.
 htmlBadStrings = [] #("\xe2\x80\x99","'"), ("\xe2\x80\x94","&mdash;"), ("\xe2\x80\x93","&ndash;"),("\xc3\x97","x")] #, ("\"","&quot;"),("<","&lang;"),(">","&rang;"),("&","&amp;")]
 
+class PageWriter:
+    """Writes a page in pieces, encoding each piece as UTF-8 into the page file as it is written, so that the page is never built up as a single string.  Obtained from RenderContext.openPage."""
+    def __init__(self,renderContext,f):
+        self.renderContext = renderContext
+        self.f = f
+        return
+    def write(self,*texts):
+        """Writes each of texts (unicode or str) to the page, in order."""
+        for text in texts:
+            if isinstance(text,unicode): text = text.encode("utf-8")
+            self.f.write(text)
+            pass
+        return
+    def close(self):
+        """Finishes the page, and closes its file."""
+        self.renderContext.closeFile(self.f)
+        self.f = None
+        return
+    pass
+
+class PageQueueException(Exception): pass
+
+class QueuedPageFile:
+    """File-like object collecting the (encoded) text of a page, which is handed to a PageQueue to be written when it is closed."""
+    def __init__(self,path,pageQueue):
+        self.path = path
+        self.pageQueue = pageQueue
+        self.pieces = []
+        return
+    def write(self,data):
+        self.pieces.append(data)
+        return
+    def close(self):
+        self.pageQueue.put(self.path,self.pieces)
+        self.pieces = None
+        return
+    pass
+
+class PageQueue(object):
+    """Writes rendered pages on a background thread, so that writing one page overlaps with rendering the next.  The queue holds at most queueSize pages, so rendering waits (stalls) when the writer falls behind.
+    Times are kept of how long rendering has stalled waiting for room in the queue (stallTime), how long the writer has waited for pages to write (idleTime), and how long it has spent writing (writeTime)."""
+    def __init__(self,queueSize=PAGEQUEUESIZE):
+        self.queue = Queue.Queue(queueSize)
+        self.stallTime = 0.0
+        self.idleTime = 0.0
+        self.writeTime = 0.0
+        self.pageCount = 0 #number of pages written
+        self.errors = [] #errors writing pages, raised by flush
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        return
+    def put(self,path,pieces):
+        """Queues the page with the given (encoded) pieces, to be written to path."""
+        start = time.time()
+        self.queue.put((path,pieces))
+        self.stallTime += time.time() - start
+        return
+    def run(self):
+        while True:
+            start = time.time()
+            page = self.queue.get()
+            self.idleTime += time.time() - start
+            if page is None: self.queue.task_done(); return #finish
+            path, pieces = page
+            start = time.time()
+            try:
+                f = open(path,"w",PAGEBUFFERSIZE)
+                f.writelines(pieces)
+                f.close()
+                self.pageCount += 1
+            except Exception, e: self.errors.append(e) #any error, not only IOError: the writer must keep going, so that flush returns (and raises it)
+            finally:
+                self.writeTime += time.time() - start
+                self.queue.task_done()
+                pass
+            pass
+        return
+    def flush(self):
+        """Waits until every queued page has been written.  Raises PageQueueException if any could not be written."""
+        self.queue.join()
+        if len(self.errors) > 0:
+            errors = self.errors
+            self.errors = []
+            raise PageQueueException("Could not write %d page(s): %s" % (len(errors),errors[0]))
+        return
+    def finish(self):
+        """Writes any queued pages, and stops the writer thread."""
+        self.queue.put(None)
+        self.thread.join()
+        self.flush()
+        return
+    pass
+
+def openPageFile(path,pageQueue=None):
+    """Opens the file for a page, or if pageQueue is given, a QueuedPageFile that will be written by pageQueue."""
+    if pageQueue is None: return open(path,"w",PAGEBUFFERSIZE)
+    return QueuedPageFile(path,pageQueue)
+
+class AnchorCache(object):
+    """Bounded cache of anchors encoded for use in links, since the same anchor is encoded at its target and again at every link to it.  Anchors are kept in two generations: when the recent generation is full it becomes the old one (discarding the previous old generation), and anchors found in the old generation are moved back to the recent one."""
+    def __init__(self,encode,maxSize=ANCHORCACHESIZE):
+        self.encode = encode #function encoding an anchor
+        self.maxSize = maxSize
+        self.recent = {}
+        self.old = {}
+        self.hits = 0
+        self.misses = 0
+        return
+    def get(self,anchor):
+        """Returns the encoded anchor, encoding it only if it is not in the cache."""
+        if anchor in self.recent:
+            self.hits += 1
+            return self.recent[anchor]
+        if anchor in self.old:
+            self.hits += 1
+            encoded = self.old[anchor]
+        else:
+            self.misses += 1
+            encoded = self.encode(anchor)
+            pass
+        if len(self.recent) >= self.maxSize: self.old = self.recent; self.recent = {}
+        self.recent[anchor] = encoded
+        return encoded
+    pass
+
+SLOTMARKER = u"\x00slot\x00" #stands in for a slot's text while a PageTemplate is compiled
+
+def encodeText(text):
+    if isinstance(text,unicode): return text.encode("utf-8")
+    return text
+
+class TemplateSlot:
+    """Slot in a PageTemplate, with the (encoded) text written before and after it when it is filled."""
+    def __init__(self,name,before,after):
+        self.name = name
+        self.before = before
+        self.after = after
+        return
+    pass
+
+class PageTemplate:
+    """Layout of a page compiled once for a render context: the fixed parts of the page are rendered and encoded in advance, and slots are left for the parts that vary from page to page (see Statute.getSectionPageTemplate)."""
+    def __init__(self,renderContext):
+        self.renderContext = renderContext
+        self.pieces = [] #each is either fixed (encoded) text, or a TemplateSlot
+        return
+    def add(self,text):
+        """Adds fixed text to the layout."""
+        text = self.renderContext.mapText(encodeText,text)
+        if len(self.pieces) > 0 and not isinstance(self.pieces[-1],TemplateSlot): self.pieces[-1] = self.pieces[-1] + text #merge with preceding fixed text
+        else: self.pieces.append(text)
+        return
+    def addSlot(self,name,before=u"",after=u"",wrapper=None):
+        """Adds a slot to the layout.  The text before and after the slot is only written if the slot is filled.  If wrapper is given, it is a rendering function (e.g., a heading) applied to the slot's text, which must include that text unchanged."""
+        if wrapper is not None:
+            wrapped = wrapper(SLOTMARKER)
+            before = before + self.renderContext.mapText(lambda text: text.split(SLOTMARKER)[0], wrapped)
+            after = self.renderContext.mapText(lambda text: text.split(SLOTMARKER)[1], wrapped) + after
+            pass
+        self.pieces.append(TemplateSlot(name,self.renderContext.mapText(encodeText,before),self.renderContext.mapText(encodeText,after)))
+        return
+    def write(self,writer,**slots):
+        """Writes the page to writer, filling each slot with the given value: rendered text, None to leave the slot out, or a function called with writer to write the slot's text."""
+        for piece in self.pieces:
+            if not isinstance(piece,TemplateSlot): writer.write(piece); continue
+            value = slots[piece.name]
+            if value is None: continue
+            writer.write(piece.before)
+            if callable(value): value(writer)
+            else: writer.write(value)
+            writer.write(piece.after)
+            pass
+        return
+    pass
+
 class RenderContext:
     fileExtension = ""
     includesBulletins = True #whether links to bulletins are available in this context
@@ -85,14 +265,27 @@ class RenderContext:
     @staticmethod
     def fileExtension():
         return ""
+    @staticmethod
+    def joinText(texts,separator=u""):
+        """Joins pieces of rendered text (see MultiContext)."""
+        return separator.join(texts)
+    @staticmethod
+    def mapText(function,*texts):
+        """Applies function to pieces of rendered text (see MultiContext)."""
+        return function(*texts)
     @classmethod
-    def openFile(classType,fname):
-        f = open(os.path.join(Constants.PAGEDIR,fname) + classType.fileExtension(),"w")
+    def openFile(classType,fname,pageDir=None,pageQueue=None):
+        if pageDir is None: pageDir = Constants.PAGEDIR
+        f = openPageFile(os.path.join(pageDir,fname) + classType.fileExtension(),pageQueue)
         return f
     @classmethod
     def closeFile(classType,f):
         f.close()
         return
+    @classmethod
+    def openPage(classType,fname,pageDir=None,pageQueue=None):
+        """Opens the page fname (in pageDir, by default PAGEDIR), returning a PageWriter to write its contents to.  If pageQueue (a PageQueue) is given, the page is written by it once the PageWriter is closed."""
+        return PageWriter(classType,classType.openFile(fname,pageDir,pageQueue))
     pass
 
 
@@ -337,6 +530,11 @@ class HTMLContext(RenderContext):
     def cleanText(text):
         #TODO: fix for python 3
         return urllib.quote(text.encode("utf8")).decode("utf8")
+    anchorCache = AnchorCache(lambda anchor: HTMLContext.cleanText(anchor)) #anchors encoded by cleanText, shared by all the Statutes rendered in a run
+    @staticmethod
+    def encodeAnchor(anchor):
+        """Returns anchor encoded by cleanText, using anchorCache."""
+        return HTMLContext.anchorCache.get(anchor)
     @staticmethod
     def cleanPlainText(text):
         """method for cleaning raw text without any formatting."""
@@ -357,7 +555,7 @@ class HTMLContext(RenderContext):
     def renderPinpoint(pinpoint, text=None):
         if text is None: linkText = pinpoint.getText()
         else: linkText = text
-        targetString = pinpoint.getPage() +HTMLContext.fileExtension() + "#" + HTMLContext.cleanText(pinpoint.getAnchor())
+        targetString = pinpoint.getPage() +HTMLContext.fileExtension() + "#" + HTMLContext.encodeAnchor(pinpoint.getAnchor())
         return "<a href=\"" + targetString + "\">" +linkText + "</a>"
     @staticmethod
     def renderPageLink(pageName,text=None):
@@ -378,7 +576,7 @@ class HTMLContext(RenderContext):
         return "<a href=\"%s\">%s</a>" %(targetURL,linkText)
     @staticmethod
     def renderAnchor(anchorTarget):
-        cleanAnchor = HTMLContext.cleanText(anchorTarget)
+        cleanAnchor = HTMLContext.encodeAnchor(anchorTarget)
         return "<a name=\"%s\"></a>"%cleanAnchor
     @staticmethod
     def renderHeading(text,level):
@@ -414,8 +612,9 @@ class HTMLContext(RenderContext):
     def fileExtension():
         return ".html"
     @classmethod
-    def openFile(classType, fname):
-        f = open(os.path.join(Constants.PAGEDIR,fname) + classType.fileExtension(),"w")
+    def openFile(classType, fname, pageDir=None, pageQueue=None):
+        if pageDir is None: pageDir = Constants.PAGEDIR
+        f = openPageFile(os.path.join(pageDir,fname) + classType.fileExtension(),pageQueue)
         f.write("<html>\n")
         f.write("<meta charset = \"utf-8\">")
         return f
@@ -427,3 +626,83 @@ class HTMLContext(RenderContext):
 
 
     pass
+
+
+#####
+#
+# Rendering in several contexts at once
+#
+#####
+
+class MultiText(tuple):
+    """Text rendered in each of the contexts of a MultiContext, in the same order.  Adding plain text adds it to each rendering."""
+    def __add__(self,other):
+        if isinstance(other,MultiText): return MultiText(a + b for a,b in zip(self,other))
+        return MultiText(a + other for a in self)
+    def __radd__(self,other):
+        return MultiText(other + a for a in self)
+    pass
+
+def selectText(text,i):
+    """Returns the rendering of text for the i-th context of a MultiContext (text may be MultiText or plain text)."""
+    if isinstance(text,MultiText): return text[i]
+    return text
+
+def multiMethod(name):
+    """Makes a MultiContext method that calls the named method of each context, giving each the renderings of its own arguments, and returns the results as MultiText."""
+    def method(self,*args,**kwargs):
+        functions = self.functions[name]
+        if MultiText not in map(type,args) and MultiText not in map(type,kwargs.itervalues()): return MultiText([f(*args,**kwargs) for f in functions]) #same arguments for every context
+        return MultiText([f(*[selectText(a,i) for a in args], **dict((k,selectText(v,i)) for k,v in kwargs.iteritems())) for i,f in enumerate(functions)])
+    method.__name__ = name
+    return method
+
+class MultiPageWriter:
+    """Writes a page rendered by a MultiContext, sending each rendering to the PageWriter for its context."""
+    def __init__(self,writers):
+        self.writers = writers
+        return
+    def write(self,*texts):
+        for text in texts:
+            if isinstance(text,MultiText):
+                for writer, t in zip(self.writers,text): writer.write(t)
+                pass
+            else:
+                if isinstance(text,unicode): text = text.encode("utf-8") #encode once for all the writers
+                for writer in self.writers: writer.write(text)
+                pass
+            pass
+        return
+    def close(self):
+        for writer in self.writers: writer.close()
+        return
+    pass
+
+class MultiContext(object):
+    """Render context that renders in several contexts at once, so that the statute is traversed (and its decorators resolved) once for all of them.  Each rendering method returns MultiText, holding the text rendered by each context, and pages are written to each context's own page directory.
+    contexts is a list of (RenderContext class, page directory) pairs."""
+    def __init__(self,contexts):
+        self.contexts = [context for context, pageDir in contexts]
+        self.pageDirs = [pageDir for context, pageDir in contexts]
+        self.functions = dict((name,[getattr(context,name) for context in self.contexts]) for name in multiMethodNames) #each context's rendering methods, looked up once
+        return
+    def joinText(self,texts,separator=u""):
+        texts = list(texts)
+        return MultiText(selectText(separator,i).join([selectText(t,i) for t in texts]) for i in xrange(len(self.contexts)))
+    def mapText(self,function,*texts):
+        return MultiText(function(*[selectText(t,i) for t in texts]) for i in xrange(len(self.contexts)))
+    def openPage(self,fname,pageQueue=None):
+        """Opens the page fname in the page directory of each context.  fname may include PAGEDIR, which is replaced by each context's directory."""
+        fname = os.path.relpath(os.path.join(Constants.PAGEDIR,fname),Constants.PAGEDIR)
+        return MultiPageWriter([context.openPage(fname,pageDir,pageQueue) for context, pageDir in zip(self.contexts,self.pageDirs)])
+    pass
+
+#rendering methods that MultiContext passes on to each of its contexts
+multiMethodNames = ["cleanText", "cleanPlainText", "documentStart", "documentEnd", "indentText", "renderPlainText", "renderPinpoint", "renderPageLink",
+                    "renderLink", "renderExternalLink", "renderAnchor", "renderHeading", "renderMarginalNote", "renderTable", "renderTOC",
+                    "horizontalLine", "newLine", "italicText", "boldText", "mailTo"]
+for name in multiMethodNames: setattr(MultiContext,name,multiMethod(name))
+
+def getAllFormatsContext():
+    """Returns a MultiContext rendering HTML pages to PAGEDIR, and MediaWiki and Wikidot pages to MEDIAWIKIPAGEDIR and WIKIPAGEDIR."""
+    return MultiContext([(HTMLContext,Constants.PAGEDIR), (MediaWikiContext,Constants.MEDIAWIKIPAGEDIR), (WikiContext,Constants.WIKIPAGEDIR)])
@@ -31,10 +31,7 @@ class SectionLabel(object):
             for tag, labelString in labelList:
                 if tag in tagSection: sectionType = tagSection[tag] #decode the short version of the section name.
                 else: sectionType = tag
-                if sectionType == "section":self.numberings.append(SectionNumbering(sectionType=sectionType,labelString=labelString))
-                elif sectionType == "definition": self.numberings.append(DefinitionNumbering(sectionType=sectionType,labelString=labelString))
-                elif sectionType == "formuladefinition": self.numberings.append(FormulaNumbering(sectionType=sectionType,labelString=labelString))
-                else: self.numberings.append(Numbering(sectionType=sectionType,labelString=labelString))
+                self.numberings.append(makeNumbering(sectionType=sectionType,labelString=labelString))
                 pass
             pass
         elif numberings != None: self.numberings = [c for c in numberings]
@@ -158,6 +155,15 @@ class FormulaNumbering(Numbering):
     def getIDString(self): return u"<" + self.labelString + u">" #return u""
     def indentIncrement(self): return 0 #TODO: should have an increment if this is inside another formula numbering (to make nested formulas clearer)
 
+def makeNumbering(sectionType,labelString):
+    """Returns a Numbering object of the appropriate class for the sectionType.
+    @rtype: Numbering
+    """
+    if sectionType == "section": return SectionNumbering(sectionType=sectionType,labelString=labelString)
+    elif sectionType == "definition": return DefinitionNumbering(sectionType=sectionType,labelString=labelString)
+    elif sectionType == "formuladefinition": return FormulaNumbering(sectionType=sectionType,labelString=labelString)
+    return Numbering(sectionType=sectionType,labelString=labelString)
+
 #####
 #
 # Code for handling statute divisions (e.g., 
@@ -303,6 +309,7 @@ class SegmentData(object):
         self.segmentContents = {} #dictionary providing a list of sections in each segment of the statute
         self.segmentContents[Segment([])] = [] #these two entries are dumping grounds for sections that are not in a Segment at all, or do not have a division / subdivision / etc
         self.segmentContents[None] = []
+        self.segmentRange = {} #dictionary indexed by Segment, giving [first sL, last sL] of the contiguous run of top-level sections in the segment
         return
     def addNewNumbering(self,newNumbering, title=None):
         """Called when a new heading numbering seen in the court of the statute.  This method computes what new segment must be (based on the latest numbering and the numberings of the preceding segment) and updates the segment information accordingly."""
@@ -325,6 +332,10 @@ class SegmentData(object):
         self.segmentContents[self.currentDivision].append(sectionLabel)
         self.segmentContents[self.currentSubdivision].append(sectionLabel)
         self.segmentContents[self.currentSegment].append(sectionLabel)
+        for segment in (self.currentPart, self.currentDivision, self.currentSubdivision, self.currentSegment): #extend the range of each enclosing segment to end at this section
+            if segment in self.segmentRange: self.segmentRange[segment][1] = sectionLabel
+            else: self.segmentRange[segment] = [sectionLabel, sectionLabel]
+            pass
         return
     def setSegmentTitle(self,segment,title):
         self.segmentTitle[segment] = title
@@ -337,6 +348,14 @@ class SegmentData(object):
         topSection = sL[:1]
         if topSection not in self.containingSegment: return None
         return self.containingSegment[topSection]
+    def getSegmentInterval(self,segment,sectionData):
+        """Returns the SectionLabelInterval covering all the sections in the Segment.  Only the first and last sections of the segment are looked up, since the sections of a segment are contiguous.  Returns None if no sections have been seen in the segment.
+        @type segment: Segment
+        @type sectionData: SectionData
+        @rtype: SectionLabelInterval
+        """
+        if segment not in self.segmentRange: return None
+        return SectionLabelInterval(sectionData=sectionData,sLList=self.segmentRange[segment])
     pass
 
 class SectionData(object):
@@ -408,7 +427,7 @@ class SectionData(object):
         """
         if sLString in self.stringToSectionItem: return self.stringToSectionItem[sLString]
         if locationSL is None:
-            if locationItem is None: showError("Could not locate sectionlabel string ["+sLString+"]",location=errorLocation); return None
+            if locationItem is None: showError("Could not locate sectionlabel string [%s]",location=errorLocation,category="unlocatedLabel",args=(sLString,)); return None
             locationSL = locationItem.getSectionLabel()
             pass
         for subLabel in locationSL.getSubLabels():
@@ -508,6 +527,11 @@ class SectionLabelCollection(object):
         for interval in self.intervals:
             if interval.containsPosition(n): return True
         return False
+    def getIntervals(self):
+        """Returns the list of (start, end) positions of the non-empty intervals in the collection (with end included, as in containsPosition).
+        @rtype: list of (int, int)
+        """
+        return [(c.start, c.end) for c in self.intervals if not c.empty]
 class UniversalSectionLabelCollection(object):
     """Object that the whole range of sections in the Statute."""
     def __init__(self,sectionData): self.sectionData = sectionData; return
@@ -515,6 +539,7 @@ class UniversalSectionLabelCollection(object):
     def __str__(self): return "<SectionUniversal>"
     def __len__(self): return len(self.sectionData.sectionList) * len(self.sectionData.sectionList) #amount that should be greater than the size of any non-universal collection
     def containsPosition(self,n): return True
+    def getIntervals(self): return None #no intervals, the collection contains every position
 
 class Pinpoint(object):
     """Object that encapsulates the location of a citation (page and anchor strings)."""
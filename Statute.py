@@ -14,7 +14,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-import os
+import os, gc, hashlib, zlib, cPickle, tempfile
 import Constants, SectionLabelLib
 import XMLStatParse
 import StatuteItem, langutil, DecoratedText
@@ -56,11 +56,39 @@ from ErrorReporter import showError
 
 class StatuteException(Exception): pass
 
+SNAPSHOTVERSION = 2 #version of the snapshot format (see Statute.storeSnapshot), to be increased whenever the classes stored in a snapshot change
+snapshotExcluded = ["statuteIndex", "statuteData", "mainPart", "identTree", "contentTree", "renderContext", "sectionPageTemplates", "pageQueue"] #Statute attributes that are not stored in snapshots
+
+def getXMLHash(statuteData):
+    """Returns the SHA-1 hash of the XML of the statute, as kept by Statute.xmlHash.
+    @type statuteData: StatuteIndex.StatuteData
+    """
+    h = hashlib.sha1()
+    for data in statuteData.iterRawXML(): h.update(data)
+    return h.hexdigest()
+
+def getSnapshotHeader(statuteData,xmlHash):
+    """Returns the header identifying a snapshot of the statute with XML hash xmlHash: (SNAPSHOTVERSION, xmlHash, hash of the XML of the statute's "Act" or None).  The Act is included since references to it are resolved against its sections when the statute is processed.
+    @type statuteData: StatuteIndex.StatuteData
+    """
+    actName = statuteData.getAct()
+    if actName is None: actHash = None
+    else: actHash = getXMLHash(statuteData.index.getStatuteData(actName))
+    return (SNAPSHOTVERSION,xmlHash,actHash)
+
+def popChildren(tree):
+    """Yields the children of the XMLStatParse Node tree in order, removing each from the tree as it is yielded (used in lean mode)."""
+    children = tree.children
+    tree.children = []
+    children.reverse()
+    while len(children) > 0: yield children.pop()
+    return
+
 class Statute(object):
     """Class that encapsulating a xml statute in a usable form.
     Based on the XMLStatuteParser, but processes the raw tree output to make it more usable."""
     #def __init__(self,data,verbose=False):
-    def __init__(self,statuteName, statuteIndex, verbose=False):
+    def __init__(self,statuteName, statuteIndex, verbose=False, lean=False):
         """
         Initialize Statute object based on it's raw XML representation.
         Metadata about the Statute is stored in following members:
@@ -68,9 +96,11 @@ class Statute(object):
         segmentData - contain information about the segments (parts / divisions / subdivisions) in the statute and which sections correspond to which segments.
         sectionData - contains information about the sections in the Statute, their text-searchable representations and their orderings.
         instrumentType - gives the type of instrument represented by the object -- currently just "statute" and "regulation"
+        In lean mode, the XML tree is released as the items are built from it: each top level node is removed from the tree once its item has been constructed, the items drop their references to their nodes, and mainPart/identTree/contentTree are not kept.  This reduces the peak memory use of processing large statutes.
         @type statuteName: str
         @type statuteIndex: StatuteIndex.StatuteIndex
         @type verbose: bool
+        @type lean: bool
         @rtype: None
         """
         self.statuteName = statuteName
@@ -78,10 +108,14 @@ class Statute(object):
         self.statuteData = self.statuteIndex.getStatuteData(self.statuteName)
         self.renderContext = RenderContext.HTMLContext
         #self.renderContext = RenderContext.MediaWikiContext
-        data = self.statuteData.getRawXML()
-
+        self.sectionPageTemplates = {} #compiled section page layouts, by render context (see getSectionPageTemplate)
+        self.pageQueue = None #RenderContext.PageQueue writing pages, while renderPages is running
+        self.pageWriteStall = None #time (in seconds) the last renderPages spent waiting for pages to be written
+        self.lean = lean #release the XML tree once the items are constructed
         p = XMLStatParse.XMLStatuteParser()
-        p.feed(data)
+        h = hashlib.sha1()
+        for data in self.statuteData.iterRawXML(): p.feed(data); h.update(data) #feed the XML as it is read and decompressed, rather than building the whole string first
+        self.xmlHash = h.hexdigest() #identifies the version of the statute in snapshots
         dataTree = p.getTree()
         if verbose: print "[XML file read]"
         self.instrumentType = None
@@ -102,26 +136,80 @@ class Statute(object):
         self.contentTree = self.mainPart["body"]
         self.processStatuteData(self.identTree) #extract meta-data about the statute from the xml
         self.processStatuteContents(self.contentTree) #extract the contents of the statute
-
+        if self.lean:
+            self.mainPart = None
+            self.identTree = None
+            self.contentTree = None
+            pass
         return
 
     #TODO, after testing, make the following part of the initialization (we've separated it out so that object can be assigned before this code is run)
     def doProcess(self):
         self.sectionData = SectionLabelLib.SectionData(statute=self)                #compile information about the ordering of sections
         self.statuteData.setSectionNameDict(self.sectionData.getSectionNameDict())  #store information about available sections
-        #TODO: also need to store data for sLDict and linkDict in the statuteData object
+        self.statuteData.setSLDict(self.sectionData.sectionStart)  #store the ordering of sections
         self.definitionData = DefinitionData(statute=self) #compile information about available definitions and their ranges of applicability
+        self.statuteData.setDefinitionRanges(self.definitionData.getDefinitionRanges())
         self.definitionData.applyToAll()
         #self.definitionData.displayDefinedTerms()
         #TODO: insert decorations for section cross-references
         self.markSectionReferences() #detect section references in text, and decorate them
 
         #create cross-link dictionary
-        linkDict = self.compileLinkDict()
-        self.statuteData.setLinkDict(linkDict)
+        self.linkDict = self.compileLinkDict()
+        self.statuteData.setLinkDict(self.linkDict)
         self.statuteData.storeIndices()
         return
 
+    ###
+    #
+    # Snapshots of the processed statute
+    #
+    ###
+
+    def __getstate__(self):
+        """Returns the state stored in a snapshot: everything except the XML tree, the StatuteIndex and the rendering state."""
+        state = self.__dict__.copy()
+        for key in snapshotExcluded: state.pop(key,None)
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.statuteIndex = None #set by loadSnapshot
+        self.statuteData = None
+        self.mainPart = None
+        self.identTree = None
+        self.contentTree = None
+        self.renderContext = RenderContext.HTMLContext
+        self.sectionPageTemplates = {}
+        self.pageQueue = None
+        return
+
+    def setIndices(self):
+        """Sets the indices found by doProcess in the StatuteData (e.g., for a statute loaded from its snapshot, or to put back those of a statute that could not be reloaded, see StatuteService.reload)."""
+        self.statuteData.setSectionNameDict(self.sectionData.getSectionNameDict())
+        self.statuteData.setSLDict(self.sectionData.sectionStart)
+        self.statuteData.setDefinitionRanges(self.definitionData.getDefinitionRanges())
+        self.statuteData.setLinkDict(self.linkDict)
+        return
+
+    def storeSnapshot(self):
+        """Stores the statute, as processed by doProcess, so that it can be rendered again without being parsed and processed (see loadSnapshot).  The snapshot includes the StatuteItems with their DecoratedText, and the SectionData, SegmentData and DefinitionData, but not the XML tree.
+        The file holds a pickled header (see getSnapshotHeader), followed by the zlib compressed pickle of the Statute."""
+        fname = self.statuteData.getSnapshotName()
+        fd, tmpName = tempfile.mkstemp(prefix=os.path.basename(fname) + ".tmp",dir=os.path.dirname(fname))
+        os.fchmod(fd,0644) #mkstemp only gives the owner access
+        try:
+            f = os.fdopen(fd,"wb")
+            cPickle.dump(getSnapshotHeader(self.statuteData,self.xmlHash),f,cPickle.HIGHEST_PROTOCOL)
+            f.write(zlib.compress(cPickle.dumps(self,cPickle.HIGHEST_PROTOCOL)))
+            f.close()
+            os.rename(tmpName,fname) #so that a partially written snapshot is never seen under its name
+        except:
+            os.remove(tmpName)
+            raise
+        return
+
     ###
     #
     # General utility methods
@@ -224,7 +312,9 @@ class Statute(object):
         self.headingList = []
         self.allItemList = []
         #iterate over subitems and add all sections to self.sectionList
-        for node in tree:
+        if self.lean: nodes = popChildren(tree) #each node can be freed once its item has been built
+        else: nodes = tree
+        for node in nodes:
             if node.tag == "": continue #top level textnodes are ignored
             #if item is a type of section
             elif node.tag == "section":
@@ -241,6 +331,7 @@ class Statute(object):
         """Processes the Node for an act section (as well as subsection, etc), and add to the Statute's structure of sections."""
         #call process section on the item, with a fake parent, then extract the item and add it to the Statute's section list
         section = StatuteItem.SectionItem(parent=None,tree=node, statute=self) #TODO: instead make parent=self, so statute determined automatically?
+        if self.lean: section.releaseTree()
         self.addSection(section)
         return
 
@@ -249,6 +340,7 @@ class Statute(object):
         #close off prior heading at same level or above
         #create the heading object and add to list
         hitem = StatuteItem.HeadingItem(parent=None,statute=self,tree=node)
+        if self.lean: hitem.releaseTree()
         self.addHeading(hitem)
         return
     def addHeading(self,heading):
@@ -317,15 +409,17 @@ class Statute(object):
     ###
 
     def markSectionReferences(self):
-        """Marks all the section references in the Statute."""
-        for item in self.itemIterator():
-            parent = item.parent
-            if isinstance(item,StatuteItem.TextItem):
-                dt = item.getDecoratedText()
-                #print(dt.getText())
-                sr = langutil.SectionReferenceParse(dt)
-                sr.addDecorators()
+        """Marks all the section references in the Statute.  The texts are first scanned together for label types, and only the flagged texts are parsed.  The number of texts parsed and the total number of texts are kept in self.referenceParseCounts."""
+        textItems = [item for item in self.itemIterator() if isinstance(item,StatuteItem.TextItem)]
+        flags = langutil.flagReferenceTexts([item.getDecoratedText().getText() for item in textItems])
+        for item, flag in zip(textItems,flags):
+            if not flag: continue
+            dt = item.getDecoratedText()
+            #print(dt.getText())
+            sr = langutil.SectionReferenceParse(dt)
+            sr.addDecorators()
             pass
+        self.referenceParseCounts = (flags.count(True),len(flags))
         return
 
     ###
@@ -334,70 +428,97 @@ class Statute(object):
     #
     ###
 
-    def renderPages(self): #TODO: this code is just a stop-gap for testing purposes
-        """Renders a page for each top-level sectionItems."""
-        #render pages
+    def setRenderContext(self,renderContext):
+        """Sets the context in which pages are rendered, e.g., RenderContext.MediaWikiContext, or a RenderContext.MultiContext to render in several formats in one pass."""
+        self.renderContext = renderContext
+        return
+
+    def renderPages(self,pageQueue=None): #TODO: this code is just a stop-gap for testing purposes
+        """Renders a page for each top-level sectionItems.  If pageQueue (a RenderContext.PageQueue, which can be shared between statutes) is given, the pages are written by it on a background thread, and renderPages waits for them all to be written before returning; the time rendering spent waiting for room in the queue is kept in self.pageWriteStall.  A PageArchive.PageArchive can be given instead, to store the pages in a single file."""
+        self.pageQueue = pageQueue
+        if pageQueue is not None: stallTime = pageQueue.stallTime
+        if hasattr(pageQueue,"startStatute"): pageQueue.startStatute(self.statuteData.getPrefix()) #a PageArchive replaces all the pages stored for this statute
 
-        for previousItem,sectionItem,nextItem in util.triples(self.sectionList): self.renderSectionPage(sectionItem,previousItem=previousItem,nextItem=nextItem)
-        self.renderCurrencyPage()
-        self.renderIndexPage()
+        #render pages
+        try:
+            for previousItem,sectionItem,nextItem in util.triples(self.sectionList): self.renderSectionPage(sectionItem,previousItem=previousItem,nextItem=nextItem)
+            self.renderCurrencyPage()
+            self.renderIndexPage()
+        except:
+            if hasattr(pageQueue,"abort"): pageQueue.abort() #a PageArchive keeps the pages stored before, instead of committing only some of the new ones with the next flush
+            raise
+        finally: self.pageQueue = None #not left pointing at the caller's queue if rendering fails
+
+        #wait for the pages to be written
+        if pageQueue is not None:
+            pageQueue.flush()
+            self.pageWriteStall = pageQueue.stallTime - stallTime
+            pass
         return
 
+    def renderSectionPageAt(self,position,pageQueue=None):
+        """Renders the page for the top-level section at position in self.sectionList, as renderPages does, so that a single page can be rendered on its own (e.g., by StatuteService, with a pageQueue that keeps the page in memory)."""
+        previousItem = self.sectionList[position-1] if position > 0 else None
+        nextItem = self.sectionList[position+1] if position+1 < len(self.sectionList) else None
+        self.pageQueue = pageQueue
+        try: self.renderSectionPage(self.sectionList[position],previousItem=previousItem,nextItem=nextItem)
+        finally: self.pageQueue = None #not left pointing at the caller's queue if rendering fails
+        return
 
-    def renderSectionPage(self,sectionItem,previousItem,nextItem):
-        """Renders the page for a sectionItem (assumed to be top-level).
-        @type sectionItem: StatuteItem.SectionItem
-        @type previousItem: StatuteItem.SectionItem
-        @type nextItem: StatuteItem.SectionItem
+    def getSectionPageTemplate(self):
+        """Returns the layout of the section pages for the current render context, compiling it the first time.  The slots are "label" (the section label in the page title), "navigation", "body" and "citations" (None if there are none).
+        @rtype: RenderContext.PageTemplate
         """
-        lab = sectionItem.getSectionLabel()[0].getIDString()
-        sL = sectionItem.getSectionLabel()
-        page = u""
+        if self.renderContext in self.sectionPageTemplates: return self.sectionPageTemplates[self.renderContext]
+        rc = self.renderContext
+        template = RenderContext.PageTemplate(rc)
 
         #header
         # - page title
-        page += self.renderContext.renderHeading(self.statuteData.getFullName() + " " + lab,1)
-        page += self.renderContext.newLine()
+        template.addSlot("label",wrapper=lambda label: rc.renderHeading(self.statuteData.getFullName() + " " + label,1))
+        template.add(rc.newLine())
 
         # - next/previous page
-        page += self.nextPreviousBlock(previousItem=previousItem,nextItem=nextItem)
-        page += self.renderContext.newLine()
-        page += self.renderContext.horizontalLine()
-        page += self.renderContext.newLine()
+        template.addSlot("navigation",after=rc.newLine() + rc.horizontalLine() + rc.newLine())
 
         #page contents
-        page += sectionItem.getRenderedText(self.renderContext,skipLabel=True,baseLevel=2) #set base level to 2 so that subsection as flush left
-        page += self.renderContext.newLine()
+        template.addSlot("body",after=rc.newLine())
 
         #footer
         # - citing sections (what objects we take references from should be configurable)
-        citeBlock = self.citationsBlock(sectionItem)
-        if citeBlock is not None:
-            page += self.renderContext.horizontalLine()
-            page += self.renderContext.newLine()
-            page += citeBlock
-            page += self.renderContext.newLine()
+        template.addSlot("citations",before=rc.horizontalLine() + rc.newLine(),after=rc.newLine())
 
         # - citing bulletins
 
         # - disclaimer
-        page += self.renderContext.horizontalLine()
-        page += self.renderContext.newLine()
-        page += self.disclaimerBlock()
+        template.add(rc.horizontalLine() + rc.newLine() + self.disclaimerBlock())
+        self.sectionPageTemplates[rc] = template
+        return template
 
+    def renderSectionPage(self,sectionItem,previousItem,nextItem):
+        """Renders the page for a sectionItem (assumed to be top-level).
+        @type sectionItem: StatuteItem.SectionItem
+        @type previousItem: StatuteItem.SectionItem
+        @type nextItem: StatuteItem.SectionItem
+        """
+        lab = sectionItem.getSectionLabel()[0].getIDString()
         fname = os.path.join(Constants.PAGEDIR, self.statuteData.getPrefix()) + " " + lab
-        f = self.renderContext.openFile(fname=fname)
-        f.write(page.encode("utf-8"))
-        self.renderContext.closeFile(f)
+        page = self.renderContext.openPage(fname=fname,pageQueue=self.pageQueue)
+        self.getSectionPageTemplate().write(page,
+                                            label=lab,
+                                            navigation=self.nextPreviousBlock(previousItem=previousItem,nextItem=nextItem),
+                                            body=lambda writer: sectionItem.writeRenderedText(writer,self.renderContext,skipLabel=True,baseLevel=2), #set base level to 2 so that subsection as flush left
+                                            citations=self.citationsBlock(sectionItem))
+        page.close()
         return
 
     def renderCurrencyPage(self):
         """Renders the page giving the currency data for the statute."""
-        page = u""
-        page += self.renderContext.renderHeading(self.statuteData.getFullName() + ": " + "Currency Information",1)
-        page += self.renderContext.newLine()
-        page += self.renderContext.horizontalLine()
-        page += self.renderContext.newLine()
+        page = self.renderContext.openPage(fname=self.currencyPageName(),pageQueue=self.pageQueue)
+        page.write(self.renderContext.renderHeading(self.statuteData.getFullName() + ": " + "Currency Information",1))
+        page.write(self.renderContext.newLine())
+        page.write(self.renderContext.horizontalLine())
+        page.write(self.renderContext.newLine())
         s = self.longTitle
         longTitleStr =  self.renderContext.italicText( self.longTitle )
         if s[:3].lower() == "an " or s[:4].lower() == "the ": pass
@@ -406,22 +527,19 @@ class Statute(object):
         else: longTitleStr += ", " + self.citationString + ","
 
 
-        page += "The copy of the " + self.statuteData.getFullName()+ " provided here is based on the " + self.renderContext.renderExternalLink(targetURL=self.statuteData.getXMLUrl(), linkText="XML version") + " of "+ longTitleStr + " downloaded from the website of the Department of Justice at " + self.renderContext.renderExternalLink(targetURL=self.statuteData.getBundleUrl()) + " on " + self.statuteData.getDownloadDate().strftime("%B %-e, %Y") + " (current to " + self.statuteData.getCurrencyDate().strftime("%B %-e, %Y") + ")."
-        fname = self.currencyPageName()
-        f = self.renderContext.openFile(fname=fname)
-        f.write(page.encode("utf-8"))
-        self.renderContext.closeFile(f)
+        page.write("The copy of the " + self.statuteData.getFullName()+ " provided here is based on the " + self.renderContext.renderExternalLink(targetURL=self.statuteData.getXMLUrl(), linkText="XML version") + " of "+ longTitleStr + " downloaded from the website of the Department of Justice at " + self.renderContext.renderExternalLink(targetURL=self.statuteData.getBundleUrl()) + " on " + self.statuteData.getDownloadDate().strftime("%B %-e, %Y") + " (current to " + self.statuteData.getCurrencyDate().strftime("%B %-e, %Y") + ").")
+        page.close()
         return
 
     def renderIndexPage(self):
         """Renders the index page for this statute."""
-        page = u""
+        page = self.renderContext.openPage(fname=self.indexPageName(),pageQueue=self.pageQueue)
         #header
         # - page title
-        page += self.renderContext.renderHeading(self.statuteData.getFullName() + " Table of Contents",1)
-        page += self.renderContext.newLine()
-        page += self.renderContext.horizontalLine()
-        page += self.renderContext.newLine()
+        page.write(self.renderContext.renderHeading(self.statuteData.getFullName() + " Table of Contents",1))
+        page.write(self.renderContext.newLine())
+        page.write(self.renderContext.horizontalLine())
+        page.write(self.renderContext.newLine())
 
         for item in self.allItemList:
             if isinstance(item,StatuteItem.SectionItem):
@@ -431,8 +549,8 @@ class Statute(object):
                 pin = self.statuteData.getPinpoint(sL)
                 title = sectionItem.getTitle()
                 if title != "": title = " (" + title + ")"
-                page += self.renderContext.renderPinpoint(pin, sL.getIDString() + title )
-                page += self.renderContext.newLine()
+                page.write(self.renderContext.renderPinpoint(pin, sL.getIDString() + title ))
+                page.write(self.renderContext.newLine())
                 pass
             elif isinstance(item,StatuteItem.HeadingItem):
                 l = [item.getLabelString(), item.getTitleString()]
@@ -440,17 +558,14 @@ class Statute(object):
                 level = 4
                 if item.getNumbering() is not None: level = item.getNumbering().getHeadingLevel()
                 title = " -- ".join(l)
-                page += self.renderContext.renderHeading(title,level)
-                page += self.renderContext.newLine()
+                page.write(self.renderContext.renderHeading(title,level))
+                page.write(self.renderContext.newLine())
                 pass
             pass
-        page += self.renderContext.horizontalLine()
-        page += self.renderContext.newLine()
-        page += self.disclaimerBlock()
-        fname =  self.indexPageName()
-        f = self.renderContext.openFile(fname=fname)
-        f.write(page.encode("utf-8"))
-        self.renderContext.closeFile(f)
+        page.write(self.renderContext.horizontalLine())
+        page.write(self.renderContext.newLine())
+        page.write(self.disclaimerBlock())
+        page.close()
         return
 
     def nextPreviousBlock(self,previousItem,nextItem):
@@ -527,7 +642,7 @@ class Statute(object):
             l.append(self.renderContext.renderPinpoint(tpin))
             pass
         if len(l) == 0: return None
-        return ", ".join(l)
+        return self.renderContext.joinText(l,", ")
 
 
     def disclaimerBlock(self):
@@ -549,6 +664,33 @@ class DummyStatute(object):
         return
     def getStatute(self): return self
 
+def loadSnapshot(statuteName,statuteIndex):
+    """Returns the Statute stored by Statute.storeSnapshot, ready to be rendered, or None if there is no usable snapshot: it is out of date (it is for another version of the XML or of the XML of its Act, or another SNAPSHOTVERSION) or cannot be read.  The statute's indices are set in its StatuteData, as doProcess would.
+    @type statuteIndex: StatuteIndex.StatuteIndex
+    @rtype: Statute
+    """
+    statuteData = statuteIndex.getStatuteData(statuteName)
+    fname = statuteData.getSnapshotName()
+    if not os.path.exists(fname): return None
+    f = open(fname,"rb")
+    enabled = gc.isenabled()
+    try:
+        header = cPickle.load(f)
+        if header != getSnapshotHeader(statuteData,getXMLHash(statuteData)): return None
+        data = zlib.decompress(f.read())
+        gc.disable() #unpickling creates a great many objects, which would otherwise set off repeated garbage collections
+        statute = cPickle.loads(data)
+    except (EOFError, zlib.error, cPickle.UnpicklingError, AttributeError, ImportError): return None #truncated, or stored by classes that have since changed: the statute is processed again
+    finally:
+        f.close()
+        if enabled: gc.enable()
+        pass
+    statute.statuteIndex = statuteIndex
+    statute.statuteData = statuteData
+    statute.definitionData.statuteData = statuteData
+    statute.setIndices()
+    return statute
+
 class DefinitionData(object):
     """Object encapsulating information about defined terms in the Statute and their ranges of applicability. And also code for marking the defined terms in the Statute once applicabilities have been determined."""
     def __init__(self,statute):
@@ -565,6 +707,12 @@ class DefinitionData(object):
         self.statuteData = self.statute.getStatuteData()
         return
 
+    def __getstate__(self):
+        """The StatuteData is not stored in snapshots, but set again by loadSnapshot."""
+        state = self.__dict__.copy()
+        state["statuteData"] = None
+        return state
+
     def scopeDefinedTerms(self):
         """Determines the scope for defined terms appearing in the Statute."""
         itemDict = {} # a dictionary of StatuteItems that are parents of definitions, indexed by sectionlabel
@@ -575,7 +723,7 @@ class DefinitionData(object):
                 if parentSL in self.applicationRange: appRange = self.applicationRange[parentSL]
                 else: # if we haven't already processed that item, do so now
                     decoratedText = parent.getInitialTextItem().getDecoratedText()
-                    appParse = langutil.ApplicationParse(decoratedText=decoratedText)
+                    appParse = langutil.applicationParseCache.getParse(decoratedText)
                     appRange = appParse.getSectionLabelCollection()
                     self.applicationRange[parentSL] = appRange
                     pass
@@ -638,6 +786,12 @@ class DefinitionData(object):
             pass
         return l
 
+    def getDefinitionRanges(self):
+        """Returns a list of (defined term, sL of definition, list of (start, end) position intervals) for the defined terms, in the form stored by StatuteIndex.StatuteData (the intervals are None if the term applies to the whole Statute).
+        @rtype: list of (str, SectionLabelLib.SectionLabel, list of (int, int))
+        """
+        return [(term, source.getSectionLabel(), appRange.getIntervals()) for term in self.definedTermList for source, appRange in self.definedTermRanges[term]]
+
     def displayDefinedTerms(self):
         """Prints out a listing of the defined terms."""
         terms = self.definedTermRanges.keys()
@@ -0,0 +1,137 @@
+# Copyright (C) 2022  Ian Caines
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Module for keeping the backups of old statute bundles in OLDSTATUTEDIR as content-addressed chunks, so successive versions of a statute only take up space for the parts that changed.
+
+The XML of each backed-up bundle is split into chunks just before each "<Section" tag (so each chunk is a top-level section and the headings that follow it), and each chunk is stored once, zlib-compressed, under the SHA-1 hash of its contents in OLDSTATUTEDIR/chunks.  The backup itself is a small manifest file, with the bundle metadata and the list of chunk hashes, stored under the name the full backup bundle would have had (see StatuteIndex.StatuteData.getBundleBackupName).  Backups stored as full bundles (before this module was used) can still be opened with openBackup.
+"""
+
+import os, re, glob, hashlib, zlib, pickle, tempfile
+import Constants, StatuteFetch
+
+class StatuteArchiveException(Exception): pass
+
+MANIFESTMAGIC = "STATMANIFEST 1\n" #first line of a manifest file
+chunkBoundaryPat = re.compile("<Section[ >]")
+chunkNamePat = re.compile("^[0-9a-f]{40}$") #name of a stored chunk (its SHA1 hash), as opposed to a temporary file being written by storeChunk
+
+def getChunkDir():
+    return os.path.join(Constants.OLDSTATUTEDIR, "chunks")
+
+def getChunkName(chunkHash):
+    """Returns the filename where the chunk with the given hash is stored."""
+    return os.path.join(getChunkDir(), chunkHash[:2], chunkHash)
+
+def splitXML(data):
+    """Returns a list of the chunks of the XML string data, which is split before each section start tag."""
+    starts = [0] + [m.start() for m in chunkBoundaryPat.finditer(data) if m.start() > 0]
+    return [data[starts[n]:(starts[n+1] if n+1 < len(starts) else len(data))] for n in xrange(len(starts))]
+
+def storeChunk(chunkHash,chunk):
+    """Stores the chunk under its hash, unless it is already stored.  Returns True if the chunk was stored."""
+    fname = getChunkName(chunkHash)
+    if os.path.exists(fname): return False
+    if not os.path.exists(os.path.dirname(fname)):
+        try: os.makedirs(os.path.dirname(fname))
+        except OSError:
+            if not os.path.isdir(os.path.dirname(fname)): raise #otherwise, created by another thread storing a chunk
+            pass
+        pass
+    fd, tmpName = tempfile.mkstemp(prefix=chunkHash + ".tmp",dir=os.path.dirname(fname)) #unique, so threads storing the same chunk (see StatuteIndex.fetchAll) do not write to the same file
+    try:
+        os.fchmod(fd,0644) #mkstemp only gives the owner access
+        f = os.fdopen(fd,"wb"); f.write(zlib.compress(chunk)); f.close()
+        os.rename(tmpName,fname) #so that a partially written chunk is never seen under its hash
+    except:
+        os.remove(tmpName)
+        raise
+    return True
+
+def openChunk(chunkHash):
+    """Returns the contents of the chunk with the given hash."""
+    f = open(getChunkName(chunkHash),"rb"); chunk = zlib.decompress(f.read()); f.close()
+    if hashlib.sha1(chunk).hexdigest() != chunkHash: raise StatuteArchiveException("Corrupted chunk: " + chunkHash)
+    return chunk
+
+def storeBackup(fname,sdict):
+    """Stores a backup of the bundle sdict as a manifest in fname, storing any chunks of its XML that are not already stored.  Returns the number of new chunks stored."""
+    newChunks = 0
+    hashes = []
+    for chunk in splitXML(sdict["XMLDATA"]):
+        chunkHash = hashlib.sha1(chunk).hexdigest()
+        if storeChunk(chunkHash,chunk): newChunks += 1
+        hashes.append(chunkHash)
+        pass
+    manifest = {"METADATA": dict((key,value) for key, value in sdict.iteritems() if key != "XMLDATA"), "CHUNKS": "".join(c.decode("hex") for c in hashes)} #hashes are stored as 20-byte digests to keep manifests small
+    f = open(fname,"wb"); f.write(MANIFESTMAGIC); pickle.dump(manifest,f,pickle.HIGHEST_PROTOCOL); f.close()
+    return newChunks
+
+def isManifest(fname):
+    f = open(fname,"rb"); start = f.read(len(MANIFESTMAGIC)); f.close()
+    return start == MANIFESTMAGIC
+
+def openManifest(fname):
+    """Returns the manifest dictionary stored in fname ("METADATA": bundle metadata, "CHUNKS": list of chunk hashes)."""
+    f = open(fname,"rb")
+    if f.read(len(MANIFESTMAGIC)) != MANIFESTMAGIC: f.close(); raise StatuteArchiveException("Not a backup manifest: " + fname)
+    manifest = pickle.load(f); f.close()
+    digests = manifest["CHUNKS"]
+    manifest["CHUNKS"] = [digests[n:n+20].encode("hex") for n in xrange(0,len(digests),20)]
+    return manifest
+
+def openBackup(fname):
+    """Returns the bundle dictionary for the backup stored in fname, which may be either a manifest or a full bundle."""
+    if not isManifest(fname): return StatuteFetch.openStatute(fname)
+    manifest = openManifest(fname)
+    sdict = dict(manifest["METADATA"])
+    sdict["XMLDATA"] = "".join(openChunk(chunkHash) for chunkHash in manifest["CHUNKS"])
+    return sdict
+
+def iterBackupXML(fname):
+    """Iterates over the XML of a backup, one chunk at a time (a backup stored as a full bundle is read with StatuteFetch.iterStatuteXML)."""
+    if not isManifest(fname): return StatuteFetch.iterStatuteXML(fname)
+    return (openChunk(chunkHash) for chunkHash in openManifest(fname)["CHUNKS"])
+
+def restoreBackup(fname,bundleName):
+    """Writes the backup stored in fname out as a bundle file bundleName."""
+    StatuteFetch.storeStatute(bundleName,sdict=openBackup(fname))
+    return
+
+def listBackups(statuteName):
+    """Returns the filenames of the backups of the named statute, oldest first."""
+    l = glob.glob(os.path.join(Constants.OLDSTATUTEDIR, statuteName + ".bundle-*"))
+    l.sort() #names end in a timestamp, so sorting puts them in date order
+    return l
+
+def getArchiveSize():
+    """Returns (number of chunks, total bytes) stored in the chunk directory, not counting temporary files being written."""
+    count = 0; size = 0
+    for fname in glob.glob(os.path.join(getChunkDir(), "*", "*")):
+        if chunkNamePat.match(os.path.basename(fname)) is None: continue
+        count += 1; size += os.path.getsize(fname)
+        pass
+    return count, size
+
+#testing
+if __name__ == "__main__":
+    import sys
+    for statuteName in sys.argv[1:]:
+        for fname in listBackups(statuteName):
+            sdict = openBackup(fname)
+            print(os.path.basename(fname) + ": amended " + str(sdict["AMEND"]) + ", " + str(len(sdict["XMLDATA"])) + " bytes of XML" + ("" if isManifest(fname) else " (full bundle)"))
+            pass
+        pass
+    count, size = getArchiveSize()
+    print(str(count) + " chunks, " + str(size) + " bytes")
@@ -0,0 +1,181 @@
+# Copyright (C) 2022  Ian Caines
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Module for finding which sections of a statute changed between two versions of its bundle, without building either Statute.
+
+Each version is parsed once with a SectionHasher, which hashes the XML of each top-level section (each section directly in the body) as it is parsed, ignoring whitespace-only text, and records where the section starts and ends in the XML.  The resulting section index is stored in STATUTEDATADIR under the SHA-1 hash of the XML, so a version that has already been indexed (e.g., the previous current bundle) is not parsed again.
+
+Usage: python StatuteDiff.py oldbundle newbundle
+The bundles can be bundle files or backups in OLDSTATUTEDIR (see StatuteArchive).  Prints a line for each added (+), removed (-) or modified (*) section.
+"""
+
+import sys, os, hashlib, pickle, HTMLParser
+import Constants, StatuteArchive, SectionLabelLib, XMLStatParse
+
+class StatuteDiffException(Exception): pass
+
+ADDED = "added"
+REMOVED = "removed"
+MODIFIED = "modified"
+
+class SectionHasher(HTMLParser.HTMLParser):
+    """Parser that hashes each top-level section of a statute's XML, without building a tree.  The finished sections are collected as (label list, hash, start, end), where the label list is as given by XMLStatParse.parseCodeParam and start and end are character offsets in the (UTF-8 decoded) XML."""
+    def __init__(self):
+        HTMLParser.HTMLParser.__init__(self)
+        self.stack = [] #tags of the open elements
+        self.sections = [] #finished sections, removed by popSections
+        self.hash = None #hash object for the section being read, if any
+        self.sectionDepth = None #length of the stack inside the section being read
+        self.labels = None
+        self.labelText = None #text of the section's label element, used if the section has no code attribute
+        self.start = None
+        self.lineStarts = [0] #character offset of the start of each line fed so far
+        self.fedLength = 0
+        return
+    def feed(self,data):
+        """Decodes the data from UTF-8, as XMLStatParse.XMLStatuteParser does."""
+        data = data.decode("utf-8")
+        n = data.find("\n")
+        while n != -1: self.lineStarts.append(self.fedLength + n + 1); n = data.find("\n",n+1)
+        self.fedLength += len(data)
+        HTMLParser.HTMLParser.feed(self,data)
+        return
+    def getOffset(self):
+        """Returns the character offset of the start of the current parser event."""
+        lineno, col = self.getpos()
+        return self.lineStarts[lineno-1] + col
+    def popSections(self):
+        """Returns the sections finished since the last call."""
+        sections = self.sections
+        self.sections = []
+        return sections
+    def handle_starttag(self,tag,attrs):
+        if self.hash is None and tag == "section" and len(self.stack) > 0 and self.stack[-1] == "body":
+            self.hash = hashlib.sha1()
+            self.sectionDepth = len(self.stack) + 1
+            attrs = XMLStatParse.attrsToDict(attrs)
+            self.labels = XMLStatParse.parseCodeParam(attrs["code"]) if "code" in attrs else None
+            self.labelText = None
+            self.start = self.getOffset()
+            pass
+        self.stack.append(tag)
+        if self.hash is not None:
+            self.hash.update(self.get_starttag_text().encode("utf-8"))
+            if tag == "label" and len(self.stack) == self.sectionDepth + 1 and self.labelText is None: self.labelText = u""
+            pass
+        return
+    def handle_endtag(self,tag):
+        if tag not in self.stack: return #stray end tag
+        while self.stack[-1] != tag: self.closeTag() #implicitly close any open tags that do not match the one being closed, as XMLStatuteParser does
+        self.closeTag()
+        return
+    def closeTag(self):
+        tag = self.stack.pop()
+        if self.hash is None: return
+        self.hash.update("</" + tag.encode("utf-8") + ">")
+        if len(self.stack) < self.sectionDepth: #the section has been closed
+            labels = self.labels
+            if labels is None: labels = [("section", (self.labelText or u"").strip().strip("()."))]
+            self.sections.append((tuple(labels), self.hash.hexdigest(), self.start, self.getEventEnd()))
+            self.hash = None
+            pass
+        return
+    def getEventEnd(self):
+        """Returns the character offset of the end of the tag being handled."""
+        offset = self.getOffset()
+        n = offset - (self.fedLength - len(self.rawdata)) #position of the tag in the data not yet consumed by the parser
+        return offset + self.rawdata.find(">",n) + 1 - n
+    def handle_startendtag(self,tag,attrs):
+        self.handle_starttag(tag,attrs)
+        self.handle_endtag(tag)
+        return
+    def handle_data(self,data):
+        if self.hash is None: return
+        if self.labelText is not None and len(self.stack) == self.sectionDepth + 1 and self.stack[-1] == "label": self.labelText += data
+        if data.strip() == "": return #whitespace-only text does not count as a change
+        self.hash.update(data.encode("utf-8"))
+        return
+    def handle_entityref(self,name):
+        if self.hash is not None: self.hash.update("&" + name.encode("utf-8") + ";")
+        return
+    def handle_charref(self,name):
+        if self.hash is not None: self.hash.update("&#" + name.encode("utf-8") + ";")
+        return
+    pass
+
+def iterXML(fname):
+    """Iterates over the XML of a bundle file or backup in pieces."""
+    return StatuteArchive.iterBackupXML(fname)
+
+def getXMLHash(fname):
+    """Returns the SHA-1 hash of the XML of a bundle file or backup."""
+    h = hashlib.sha1()
+    for data in iterXML(fname): h.update(data)
+    return h.hexdigest()
+
+def getSectionIndexName(xmlHash):
+    return os.path.join(Constants.STATUTEDATADIR, xmlHash + ".sections")
+
+def iterSections(fname, useIndex=True):
+    """Iterates over (label list, hash, start, end) for each top-level section in a bundle file or backup, in order.  If useIndex is True, the stored section index is used if there is one, and otherwise one is stored once the XML has been parsed."""
+    indexName = None
+    if useIndex:
+        indexName = getSectionIndexName(getXMLHash(fname))
+        if os.path.exists(indexName):
+            f = open(indexName,"rb"); sections = pickle.load(f); f.close()
+            for section in sections: yield section
+            return
+        pass
+    hasher = SectionHasher()
+    sections = []
+    for data in iterXML(fname):
+        hasher.feed(data)
+        for section in hasher.popSections(): sections.append(section); yield section
+        pass
+    if indexName is not None and os.path.isdir(os.path.dirname(indexName)):
+        f = open(indexName,"wb"); pickle.dump(sections,f,pickle.HIGHEST_PROTOCOL); f.close()
+        pass
+    return
+
+def diffSections(oldName, newName, useIndex=True):
+    """Generator comparing the top-level sections of two versions of a statute, yielding (change, SectionLabel) for each section that was ADDED, REMOVED or MODIFIED.  Added and modified sections are yielded while the new version is being parsed, and removed sections at the end."""
+    oldSections = [c for c in iterSections(oldName,useIndex)]
+    oldHashes = {}
+    for labels, sectionHash, start, end in oldSections: oldHashes[labels] = sectionHash
+    seen = set()
+    for labels, sectionHash, start, end in iterSections(newName,useIndex):
+        seen.add(labels)
+        if labels not in oldHashes: yield ADDED, SectionLabelLib.SectionLabel(labelList=labels)
+        elif oldHashes[labels] != sectionHash: yield MODIFIED, SectionLabelLib.SectionLabel(labelList=labels)
+        pass
+    for labels, sectionHash, start, end in oldSections:
+        if labels not in seen: yield REMOVED, SectionLabelLib.SectionLabel(labelList=labels)
+        pass
+    return
+
+def getSectionXML(fname, start, end):
+    """Returns the XML of a section of a bundle file or backup, given its start and end (as found by iterSections).
+    @rtype: unicode
+    """
+    return "".join(iterXML(fname)).decode("utf-8")[start:end]
+
+changeMarks = {ADDED: "+", REMOVED: "-", MODIFIED: "*"}
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3: print("Usage: python StatuteDiff.py oldbundle newbundle"); sys.exit(1)
+    for change, sL in diffSections(sys.argv[1],sys.argv[2]):
+        print(changeMarks[change] + " " + sL.getIDString())
+        sys.stdout.flush()
+        pass
@@ -13,11 +13,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-"""Module for fetching statute xml from justice website and bundling into a file."""
+"""Module for fetching statute xml from justice website and bundling into a file.
 
-import urllib2, urlparse, re, datetime, pickle
+Bundle file format (version 2):
+The file starts with a header (magic string, version number, compression of the XML, length of the metadata, stored length of the XML), followed by the metadata (a pickled dictionary of all the bundle entries other than "XMLDATA"), followed by the XML of the statute, compressed with zlib unless the compression is NOCOMPRESSION.  Integers are little-endian 32-bit.  The metadata can therefore be read without reading the XML (see openStatuteMetadata), and the XML can be read on its own, either whole (see openStatuteXML) or decompressed a block at a time (see iterStatuteXML).  Version 1 bundles (the same, without compression) and older bundles, which are a pickle of the whole dictionary, can still be read.
+"""
 
-allowedKeys = ["DOWNLOAD", "CURRENCY", "AMEND", "XMLDATA","URL","XMLURL"] #this are the only keys that should appear in a statute bundle
+import os, urllib2, urlparse, httplib, socket, threading, time, re, datetime, pickle, struct, zlib
+
+allowedKeys = ["DOWNLOAD", "CURRENCY", "AMEND", "XMLDATA","URL","XMLURL","ETAG","LASTMODIFIED"] #this are the only keys that should appear in a statute bundle
 
 class StatuteFetchException(Exception): pass
 
@@ -25,17 +29,106 @@ currentToPat = re.compile("current to (?P<date>(?P<year>\d\d\d\d)-(?P<month>\d+)
 amendedPat = re.compile("last amended on (?P<date>(?P<year>\d\d\d\d)-(?P<month>\d+)-(?P<day>\d+))")
 xmlPat = re.compile("<a href=('|\")(?P<url>[^\">]*)('|\")>XML")
 
+BUNDLEMAGIC = "STATBNDL"
+BUNDLEVERSION = 2
+NOCOMPRESSION = 0
+ZLIBCOMPRESSION = 1
+BUNDLECOMPRESSION = ZLIBCOMPRESSION #compression used for the XML when storing bundles
+XMLBLOCKSIZE = 1 << 16 #number of bytes of stored XML read at a time by iterStatuteXML
+bundleHeaderStruct = struct.Struct("<8sI") #magic, version
+bundleLengthStructs = {1: struct.Struct("<II"), #version 1: metadata length, xml length
+                       2: struct.Struct("<III")} #version 2: compression, metadata length, stored xml length
+
+def readBundleHeader(f):
+    """Reads the header of an open bundle file.  Returns (compression, metadata length, stored xml length), or None if the file is an older (pickled) bundle, in which case the file is returned to its start."""
+    data = f.read(bundleHeaderStruct.size)
+    if len(data) < bundleHeaderStruct.size or data[:len(BUNDLEMAGIC)] != BUNDLEMAGIC: f.seek(0); return None
+    magic, version = bundleHeaderStruct.unpack(data)
+    if version not in bundleLengthStructs: raise StatuteFetchException("Unsupported bundle version " + str(version) + ": " + f.name)
+    lengthStruct = bundleLengthStructs[version]
+    lengths = lengthStruct.unpack(f.read(lengthStruct.size))
+    if version == 1: return (NOCOMPRESSION,) + lengths
+    if lengths[0] not in (NOCOMPRESSION, ZLIBCOMPRESSION): raise StatuteFetchException("Unknown bundle compression " + str(lengths[0]) + ": " + f.name)
+    return lengths
+
 def openStatute(fname):
     """Open a statute file and return the dictionary."""
-    f = open(fname,"rb"); xstat = pickle.load(f); f.close()
+    xstat = openStatuteMetadata(fname)
+    xstat["XMLDATA"] = openStatuteXML(fname)
+    return xstat
+
+def openStatuteMetadata(fname):
+    """Open a statute file and return the dictionary without the "XMLDATA" entry.  Only the header of the file is read (unless it is an older bundle)."""
+    f = open(fname,"rb")
+    header = readBundleHeader(f)
+    if header is None: xstat = pickle.load(f); del xstat["XMLDATA"]
+    else: xstat = pickle.loads(f.read(header[1]))
+    f.close()
     return xstat
 
-def storeStatute(fname, url=None,sdict=None):
-    """Store statute to a specified file. Statute may be supplied by either url or a statue dictionary."""
+def openStatuteXML(fname):
+    """Open a statute file and return only its XML data."""
+    return "".join(iterStatuteXML(fname))
+
+def iterStatuteXML(fname,blockSize=XMLBLOCKSIZE):
+    """Generator that reads the XML data of a statute file in blocks, decompressing as it goes, and yields it in pieces.  Each piece except the first starts with "<", so the pieces can be fed one at a time to the XML parser without splitting any text run or multi-byte character: "<" cannot appear raw in XML text, whereas ">" can (older bundles are yielded whole)."""
+    f = open(fname,"rb")
+    try:
+        header = readBundleHeader(f)
+        if header is None: yield pickle.load(f)["XMLDATA"]; return
+        compression, metaLength, remaining = header
+        f.seek(metaLength,1)
+        decompressor = zlib.decompressobj() if compression == ZLIBCOMPRESSION else None
+        pending = "" #data from the last "<" seen, held back until the next block
+        while remaining > 0:
+            block = f.read(min(blockSize,remaining))
+            if block == "": raise StatuteFetchException("Bundle file truncated: " + fname)
+            remaining -= len(block)
+            if decompressor is not None: block = decompressor.decompress(block)
+            data = pending + block
+            n = data.rfind("<")
+            if n < 0: n = 0 #no tag yet, hold back the whole text run
+            pending = data[n:]
+            if n > 0: yield data[:n]
+            pass
+        if decompressor is not None: pending += decompressor.flush()
+        if pending != "": yield pending
+    finally:
+        f.close()
+    return
+
+def storeStatute(fname, url=None,sdict=None,compression=BUNDLECOMPRESSION):
+    """Store statute to a specified file. Statute may be supplied by either url or a statue dictionary.  The XML is compressed as specified by compression (NOCOMPRESSION or ZLIBCOMPRESSION)."""
     if url is None and sdict is None: raise StatuteFetchException("storeStatute requires that either url or sdict be non-None.")
     if sdict is not None: xstat = sdict
     else: xstat = fetchStatute(url)
-    f = open(fname,"wb"); pickle.dump(xstat,f); f.close()
+    metadata = pickle.dumps(dict((key,value) for key, value in xstat.iteritems() if key != "XMLDATA"))
+    data = xstat["XMLDATA"]
+    if compression == ZLIBCOMPRESSION: data = zlib.compress(data)
+    elif compression != NOCOMPRESSION: raise StatuteFetchException("Unknown bundle compression " + str(compression))
+    f = open(fname,"wb")
+    f.write(bundleHeaderStruct.pack(BUNDLEMAGIC,BUNDLEVERSION))
+    f.write(bundleLengthStructs[BUNDLEVERSION].pack(compression,len(metadata),len(data)))
+    f.write(metadata); f.write(data); f.close()
+    return
+
+def updateStatuteMetadata(fname,updates):
+    """Replaces the entries in updates (a dictionary) in the metadata of a statute file, keeping the stored XML as it is."""
+    f = open(fname,"rb")
+    header = readBundleHeader(f)
+    if header is None: f.close(); xstat = openStatute(fname); xstat.update(updates); storeStatute(fname,sdict=xstat); return
+    compression, metaLength, xmlLength = header
+    metadata = pickle.loads(f.read(metaLength))
+    data = f.read(xmlLength) #stored (possibly compressed) XML, copied without decompressing
+    f.close()
+    metadata.update(updates)
+    metadata = pickle.dumps(metadata)
+    tmpName = fname + ".tmp"
+    f = open(tmpName,"wb")
+    f.write(bundleHeaderStruct.pack(BUNDLEMAGIC,BUNDLEVERSION))
+    f.write(bundleLengthStructs[BUNDLEVERSION].pack(compression,len(metadata),len(data)))
+    f.write(metadata); f.write(data); f.close()
+    os.rename(tmpName,fname)
     return
 
 def packageFile(xmlname, fname):
@@ -53,10 +146,10 @@ def packageFile(xmlname, fname):
 
 def isStatuteUpdated(fname):
     """Checks whether a statute has accumulated any further amendments."""
-    statDict = openStatute(fname)
+    statDict = openStatuteMetadata(fname)
     url = statDict["URL"]
     newDict = readStatutePage(url)
-    return statDictUpdated(statDict, newDict)
+    return isStatDictUpdated(statDict, newDict)
 
 def isStatDictUpdated(oldDict, newDict):
     """Compares to statute meta-data dictionaries and determines if the second is strictly more recent."""
@@ -68,29 +161,125 @@ def isStatDictUpdated(oldDict, newDict):
         return False
     return
 
-def fetchStatute(url,amendDate=None, priorVersion=None):
+HOSTDELAY = 1.0 #minimum number of seconds between the starts of requests to the same host by a Fetcher
+
+class Fetcher(object):
+    """Object for fetching urls from several threads at once.  Each thread keeps one connection open to each host, which is reused for later requests, and the requests to each host are spaced out by at least hostDelay seconds."""
+    def __init__(self,hostDelay=HOSTDELAY,timeout=60):
+        self.hostDelay = hostDelay
+        self.timeout = timeout
+        self.local = threading.local() #holds the connections of each thread
+        self.lock = threading.Lock()
+        self.nextRequestTime = {} #earliest time for the next request to each host
+        self.requestCount = 0
+        self.connectionCount = 0
+        self.notModifiedCount = 0 #number of conditional requests answered "not modified"
+        return
+    def waitForHost(self,host):
+        """Waits until a request may be made to host, and reserves the following slot."""
+        with self.lock:
+            now = time.time()
+            requestTime = max(now, self.nextRequestTime.get(host,now))
+            self.nextRequestTime[host] = requestTime + self.hostDelay
+            self.requestCount += 1
+            pass
+        if requestTime > now: time.sleep(requestTime - now)
+        return
+    def getConnection(self,scheme,host):
+        """Returns this thread's connection to the host, opening it if necessary."""
+        if not hasattr(self.local,"connections"): self.local.connections = {}
+        key = (scheme,host)
+        if key not in self.local.connections:
+            if scheme == "https": self.local.connections[key] = httplib.HTTPSConnection(host,timeout=self.timeout)
+            else: self.local.connections[key] = httplib.HTTPConnection(host,timeout=self.timeout)
+            with self.lock: self.connectionCount += 1
+            pass
+        return self.local.connections[key]
+    def dropConnection(self,scheme,host):
+        conn = self.local.connections.pop((scheme,host),None)
+        if conn is not None: conn.close()
+        return
+    def request(self,url,headers={},redirects=5):
+        """Makes a GET request for url with the given headers, following redirects.  Returns the httplib.HTTPResponse (which has been read) and the data read."""
+        uparse = urlparse.urlparse(url)
+        path = uparse.path or "/"
+        if uparse.query != "": path += "?" + uparse.query
+        self.waitForHost(uparse.netloc)
+        for attempt in xrange(2): #a kept-alive connection may have been closed by the server, so retry once on a new connection
+            conn = self.getConnection(uparse.scheme,uparse.netloc)
+            try:
+                conn.request("GET",path,headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (httplib.HTTPException, socket.error):
+                self.dropConnection(uparse.scheme,uparse.netloc)
+                if attempt == 1: raise
+                pass
+            pass
+        if response.getheader("connection","").lower() == "close": self.dropConnection(uparse.scheme,uparse.netloc)
+        if response.status in (301,302,303,307) and redirects > 0: return self.request(urlparse.urljoin(url,response.getheader("location")),headers,redirects-1)
+        if response.status == 304:
+            with self.lock: self.notModifiedCount += 1
+            pass
+        elif response.status != 200: raise StatuteFetchException("HTTP error " + str(response.status) + ": " + url)
+        return response, data
+    def read(self,url):
+        """Returns the contents of url."""
+        return self.request(url)[1]
+    pass
+
+def readURL(url,fetcher=None):
+    """Returns the contents of url, read with the fetcher if one is given."""
+    if fetcher is None: return urllib2.urlopen(url).read()
+    return fetcher.read(url)
+
+def readURLConditional(url,etag=None,lastModified=None,fetcher=None):
+    """Reads url with a conditional request, if an ETag or Last-Modified value from an earlier response is given.  Returns (data, ETag, Last-Modified) with the values from the response, or (None, None, None) if the server reports that url has not been modified."""
+    headers = {}
+    if etag is not None: headers["If-None-Match"] = etag
+    if lastModified is not None: headers["If-Modified-Since"] = lastModified
+    if fetcher is not None:
+        response, data = fetcher.request(url,headers=headers)
+        if response.status == 304: return None, None, None
+        return data, response.getheader("etag"), response.getheader("last-modified")
+    try:
+        response = urllib2.urlopen(urllib2.Request(url,headers=headers))
+    except urllib2.HTTPError, e:
+        if e.code == 304: return None, None, None
+        raise
+    return response.read(), response.info().getheader("etag"), response.info().getheader("last-modified")
+
+def fetchStatute(url,amendDate=None, priorVersion=None, fetcher=None, pageDict=None):
     """Processes the top url for a statute, and returns a dictionary
     { "DOWNLOAD": download datetime (of the top-level page),
     "CURRENCY": currency date,
     "AMEND": amendment date,
     "XMLDATA": xml representation of statute, as a string,
     "URL": the url of the top page for statute,
-    "XMLURL": the url of xml contents of statute}
+    "XMLURL": the url of xml contents of statute,
+    "ETAG", "LASTMODIFIED": the ETag and Last-Modified headers sent with the top page (or None)}
 
     if either optional parameter amendDate or priorVersion (a statute dictionary) is given, then will return None unless the posted act reports a more recent amendment date or the contents of the XML have been changed (respectively).
+    If pageDict (the result of readStatutePage for url) is given, the top page is not read again.
     """
     #TODO - implement handling of priorVersion parameter
-    #TODO - zip the xml data in the "DATA" parameter?
-    statDict = readStatutePage(url)
+    if pageDict is not None: statDict = dict(pageDict)
+    else: statDict = readStatutePage(url,fetcher=fetcher)
     if amendDate != None:
         if statDict["AMEND"] <= amendDate: return None
 
-    statDict["XMLDATA"] = urllib2.urlopen(statDict["XMLURL"]).read()
+    statDict["XMLDATA"] = readURL(statDict["XMLURL"],fetcher=fetcher)
     return statDict
 
-def readStatutePage(url):
-    """Reads the top page for a statute and return a dictionary containing the metadata found there (currency, amendment date, download time.  Basically, everything except the raw xml of the statute."""
-    page = urllib2.urlopen(url).read()
+def readStatutePage(url,fetcher=None,priorDict=None):
+    """Reads the top page for a statute and return a dictionary containing the metadata found there (currency, amendment date, download time.  Basically, everything except the raw xml of the statute.
+    If priorDict (metadata from an earlier read) is given with an ETag or Last-Modified value, the page is requested conditionally, and None is returned if it has not been modified.
+    """
+    etag, lastModified = None, None
+    if priorDict is not None: etag, lastModified = priorDict.get("ETAG"), priorDict.get("LASTMODIFIED")
+    page, etag, lastModified = readURLConditional(url,etag=etag,lastModified=lastModified,fetcher=fetcher)
+    if page is None: return None
     currentm = currentToPat.search(page)
     amendm = amendedPat.search(page)
     if currentm is None: raise StatuteFetchException("Could not find currency date: " + url)
@@ -109,6 +298,8 @@ def readStatutePage(url):
     if xparse.netloc == '': xparse = uparse._replace(path=xparse.path)
     xurl = urlparse.urlunparse(xparse)
     statDict["XMLURL"] = xurl
+    statDict["ETAG"] = etag
+    statDict["LASTMODIFIED"] = lastModified
     return statDict
 
 #testing
@@ -25,8 +25,8 @@ __author__ = 'caines'
 
 #TODO: rename this StatuteMetaData, and include the DefinitionData object?
 
-import pickle, re, os, datetime
-import Constants, StatuteFetch, Statute, SectionLabelLib
+import re, os, datetime, threading, Queue
+import Constants, StatuteFetch, StatuteArchive, Statute, SectionLabelLib, StatuteIndexFile, StatuteIndexDB
 from ErrorReporter import showError
 
 class StatuteIndexException(Exception): pass
@@ -52,8 +52,12 @@ class StatuteIndex(object):
     def __init__(self):
         self.statuteDataDict = {}
         self.statuteList = []
+        self.indexDB = None #StatuteIndexDB.IndexDB, opened when first needed if Constants.INDEXDBFILE is set
         self.loadConfig() #populate self.statuteDataDict with objects for the statutes of interest
         return
+    def __reduce__(self):
+        """The index is never pickled: snapshots (see Statute.storeSnapshot) must not take a copy of it, but be attached to the running index when loaded."""
+        raise StatuteIndexException("StatuteIndex cannot be pickled")
     def loadConfig(self):
         """Processes th stat_config.txt file, and creates a StatuteData object for each of the specified statutes."""
         f = open(Constants.STATUTECONFIGFILE,"r"); lines = [c for c in f]; f.close()
@@ -98,11 +102,46 @@ class StatuteIndex(object):
         @rtype: StatuteData
         """
         return self.statuteDataDict[name]
-    def getStatute(self,name):
-        """Returns the Statute object representing the parsed statute.
+    def getStatute(self,name,lean=False):
+        """Returns the Statute object representing the parsed statute.  If lean is True, the statute does not keep its XML tree (see Statute.Statute).
         @rtype: Statute.Statute
         """
-        return Statute.Statute(statuteName=name,statuteIndex=self)
+        return Statute.Statute(statuteName=name,statuteIndex=self,lean=lean)
+    def getProcessedStatute(self,name):
+        """Returns the Statute object for the named statute, after doProcess.  The statute is loaded from its snapshot if there is an up-to-date one, and otherwise parsed, processed, and stored as a snapshot (see Statute.storeSnapshot).
+        @rtype: Statute.Statute
+        """
+        statute = Statute.loadSnapshot(statuteName=name,statuteIndex=self)
+        if statute is not None: return statute
+        statute = self.getStatute(name,lean=True) #the XML tree is not needed once processed, nor kept in the snapshot
+        statute.doProcess()
+        statute.storeSnapshot()
+        return statute
+    def fetchAll(self, names=None, threadCount=4, fetcher=None):
+        """Loads the bundles for the named statutes (by default, all of them) using threadCount threads, checking for updates and fetching from their urls as getBundle would.  The threads share a StatuteFetch.Fetcher, which reuses connections and limits the rate of requests to each host.  Returns a dictionary of the exceptions raised for any statutes that could not be loaded, indexed by name."""
+        if names is None: names = self.getStatuteList()
+        if fetcher is None: fetcher = StatuteFetch.Fetcher()
+        nameQueue = Queue.Queue()
+        for name in names: nameQueue.put(name)
+        errors = {}
+        def work():
+            while True:
+                try: name = nameQueue.get_nowait()
+                except Queue.Empty: return
+                try: self.getStatuteData(name).getBundle(fetcher=fetcher).pop("XMLDATA",None) #once stored, the XML is read back from the bundle file when needed, rather than holding every statute in memory
+                except Exception, e: errors[name] = e; showError("Could not load statute ["+name+"]: " + str(e),header="LOADING")
+                pass
+            return
+        threads = [threading.Thread(target=work) for n in xrange(min(threadCount,len(names)))]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        return errors
+    def getIndexDB(self):
+        """Returns the database of statute indices, or None if Constants.INDEXDBFILE is not set.
+        @rtype: StatuteIndexDB.IndexDB
+        """
+        if self.indexDB is None and Constants.INDEXDBFILE is not None: self.indexDB = StatuteIndexDB.IndexDB(Constants.INDEXDBFILE)
+        return self.indexDB
     def __getitem__(self,name):
         """Allow StatuteData objects to be fetched with [] notation.
         @type name: str
@@ -138,16 +177,23 @@ class StatuteData(object):
         self.bundle = None #the statute bundle for this statute, is set once loaded
         self.rawName = None #filename where XML content can be located on disk (only useful if fileOnly is set)
         self.noCheck = False #if True, then url will not be check if xml already available locally
-        self.indexLoaded = False #Set to True once indexes have been loaded from file, if loading is successful
+        self.indexLoaded = False #Set to True once the index file has been opened (the indices themselves are decoded when first needed)
+        self.indexFile = None #the StatuteIndexFile.IndexFile for this statute, once opened
+        self.indexDB = None #the StatuteIndexDB.IndexDB holding the indices for this statute, if any
+        self.indexDBChecked = False #Set to True once we have looked for the statute in the index database
 
         #the following three variables contain meta data about the Statute and are regenerated when the Statute object is loaded.
         #TODO: other metadata to store: (1) names of sections, (2) more information about sectoin ordering?
         self.sLDict = None #dictionary indexed by sL objects giving the ordinal position of the sL in the Statute (allows ordering)
         self.sectionNameDict = None #dictionary indexed by the string labels of sections in this statute, and pointing to SLs
         self.linkDict = None #dictionary of external links -- indexed by external statute name, then by target sL, then a list of source sLs in this Statute.
+        self.definitionRanges = None #list of (defined term, sL of definition, application range intervals), only stored in the index database
         return
 
     def __str__(self): return "<StatuteData: name:["+ str(self.name)+"] url:["+str(self.url)+"]>"
+    def __reduce__(self):
+        """Likewise, StatuteData is never pickled (see StatuteIndex.__reduce__)."""
+        raise StatuteIndexException("StatuteData cannot be pickled [" + str(self.name) + "]")
     def getName(self): return self.name
     def setPrefix(self,prefix):
         self.prefix = prefix
@@ -193,18 +239,32 @@ class StatuteData(object):
         """Returns the filename that should contain the bundle for this statute, if it exists."""
         return os.path.join(Constants.STATUTEDIR, self.name + ".bundle")
     def getBundleBackupName(self):
-        """Returns the filename for a current back of the statue bundle."""
+        """Returns the filename for a current back of the statue bundle (stored as a manifest of chunks, see StatuteArchive)."""
         return os.path.join(Constants.OLDSTATUTEDIR,self.name + ".bundle" + "-" + datetime.datetime.today().strftime("%Y-%m-%d+%Hh-%Mm-%Ss"))
-    def getRawXML(self): self.getBundle(); return self.bundle["XMLDATA"]
+    def getRawXML(self):
+        """Returns the XML of the statute.  Unless the bundle has just been fetched, the XML is read from the bundle file (it is not kept with the bundle metadata)."""
+        self.getBundle()
+        if "XMLDATA" in self.bundle: return self.bundle["XMLDATA"]
+        return StatuteFetch.openStatuteXML(self.getBundleName())
+    def iterRawXML(self):
+        """Iterates over pieces of the XML of the statute, read from the bundle file as needed (see StatuteFetch.iterStatuteXML)."""
+        self.getBundle()
+        if "XMLDATA" in self.bundle: return iter([self.bundle["XMLDATA"]])
+        return StatuteFetch.iterStatuteXML(self.getBundleName())
     def getXMLUrl(self): self.getBundle(); return self.bundle["XMLURL"]
     def getBundleUrl(self): self.getBundle(); return self.bundle["URL"]
     def getAmendDate(self): self.getBundle(); return self.bundle["AMEND"]
     def getCurrencyDate(self): self.getBundle(); return self.bundle["CURRENCY"]
     def getDownloadDate(self): self.getBundle(); return self.bundle["DOWNLOAD"].date()
-    def getBundle(self, forceFetch = False):
-        """Returns bundle for the statute.  If bundle had to be loaded from url, a copy is saved to local file.  When fetching, checks if a more recent version is posted.
+    def clearBundle(self):
+        """Forgets the bundle metadata, so that it is read again by the next getBundle (e.g., once the bundle file has been replaced)."""
+        self.bundle = None
+        return
+    def getBundle(self, forceFetch = False, fetcher = None):
+        """Returns bundle for the statute.  If bundle had to be loaded from url, a copy is saved to local file.  When fetching, checks if a more recent version is posted.  A bundle read from file only contains the metadata, the XML is read by getRawXML.
         forceFetch - force retrieving XML from url
         updateCheck - if statute has been retrieved from file, check if update version online (default True)
+        fetcher - StatuteFetch.Fetcher used for reading urls (if None, urls are read with urllib2)
         """
         if self.bundle is not None: return self.bundle
 
@@ -212,7 +272,7 @@ class StatuteData(object):
         #try to open file:
         bundle = None
         try:
-            bundle = StatuteFetch.openStatute(fname)
+            bundle = StatuteFetch.openStatuteMetadata(fname)
         except IOError:
             if self.fileOnly: #if file not available *and* we only want file, then package from rawXML if possible, otherwise raise exception.
                 if self.rawName is None: raise StatuteIndexException("Error on forced read from file [" + self.name + "]")
@@ -223,20 +283,29 @@ class StatuteData(object):
         readNew = False #have we read new XML data from the internet?
         if (bundle is None) or forceFetch: #nothing so far, so definitely need to read from url (or being forced to)
             showError("No file, fetching from url ["+self.name+"].",header="LOADING")
-            bundle = StatuteFetch.fetchStatute(self.getUrl())
+            bundle = StatuteFetch.fetchStatute(self.getUrl(),fetcher=fetcher)
             showError("Statute loaded from url.", header="LOADING")
             readNew = True
             pass
         elif not self.noCheck and not self.fileOnly: #we have the bundle locally, only check url if updateCheck is set
             showError("File present, checking for update ["+self.name+"].",header="LOADING")
-            newData = StatuteFetch.readStatutePage(self.getUrl())
-            if StatuteFetch.isStatDictUpdated(bundle,newData): showError("Update found, loading from url ["+self.name+"].",header="LOADING"); bundle = StatuteFetch.fetchStatute(self.getUrl()); readNew = True
-            else: showError("No update found.", header="LOADING")
+            newData = StatuteFetch.readStatutePage(self.getUrl(),fetcher=fetcher,priorDict=bundle) #conditional request, None if the page has not been modified
+            if newData is None: showError("No update found (page not modified).", header="LOADING")
+            elif StatuteFetch.isStatDictUpdated(bundle,newData): showError("Update found, loading from url ["+self.name+"].",header="LOADING"); bundle = StatuteFetch.fetchStatute(self.getUrl(),fetcher=fetcher,pageDict=newData); readNew = True
+            else:
+                showError("No update found.", header="LOADING")
+                if (newData["ETAG"], newData["LASTMODIFIED"]) != (bundle.get("ETAG"), bundle.get("LASTMODIFIED")): #keep the validators for the page, so the next check can be conditional
+                    updates = {"ETAG": newData["ETAG"], "LASTMODIFIED": newData["LASTMODIFIED"]}
+                    StatuteFetch.updateStatuteMetadata(fname,updates)
+                    bundle.update(updates)
+                    pass
+                pass
             pass
         else: pass
         if readNew: #if we have read a new statute from url, output a copy of bundle to back directory
             StatuteFetch.storeStatute(fname,sdict=bundle)
-            StatuteFetch.storeStatute(self.getBundleBackupName(),sdict=bundle)
+            newChunks = StatuteArchive.storeBackup(self.getBundleBackupName(),sdict=bundle)
+            showError("Backup stored, " + str(newChunks) + " new chunks ["+self.name+"].",header="LOADING")
             pass
         self.bundle = bundle
         return self.bundle
@@ -259,6 +328,10 @@ class StatuteData(object):
         """Set the linksDict for this Statute. Indexed by Statute name, and then by """
         self.linkDict = linkDict
         return
+    def setDefinitionRanges(self, definitionRanges):
+        """Sets the defined terms of this statute, as a list of (defined term, sL of definition, list of (start, end) position intervals where the term applies, or None if it applies throughout)."""
+        self.definitionRanges = definitionRanges
+        return
     def setIndices(self, sLDict=None,sectionNameDict=None,linksDict=None):
         """Set all the indices for statute at once, and store to file."""
         #TODO
@@ -267,29 +340,96 @@ class StatuteData(object):
     def getIndexName(self):
         """Returns the filename where indices for this statute are stored."""
         return os.path.join(Constants.STATUTEDATADIR, self.name + ".index")
+    def getSnapshotName(self):
+        """Returns the filename where a snapshot of the processed statute is stored (see Statute.storeSnapshot)."""
+        return os.path.join(Constants.STATUTEDATADIR, self.name + ".snapshot")
     def storeIndices(self):
-        """Causes the index information in the file to be stored to the appropriate file."""
-        f = file(self.getIndexName(),"wb")
-        pickle.dump((self.sLDict,self.sectionNameDict,self.linkDict),f)
-        f.close()
+        """Causes the index information in the file to be stored to the appropriate file (see StatuteIndexFile for the format), and to the index database if one is in use."""
+        StatuteIndexFile.writeIndexFile(self.getIndexName(),sLDict=self.sLDict,sectionNameDict=self.sectionNameDict,linkDict=self.linkDict)
+        db = self.index.getIndexDB()
+        if db is not None:
+            db.storeStatute(self.name,sLDict=self.sLDict,sectionNameDict=self.sectionNameDict,linkDict=self.linkDict,definitionRanges=self.definitionRanges)
+            self.indexDB = db; self.indexDBChecked = True
+            pass
         return
+    def getIndexDB(self):
+        """Returns the index database if it holds the indices for this statute, otherwise None (in which case the index file is used).
+        @rtype: StatuteIndexDB.IndexDB
+        """
+        if self.indexDBChecked: return self.indexDB
+        self.indexDBChecked = True
+        db = self.index.getIndexDB()
+        if db is None: return None
+        if not db.hasStatute(self.name): showError("["+self.name+"] Statute not found in index database, using index file"); return None
+        self.indexDB = db
+        return self.indexDB
     def loadIndices(self):
-        """Loads all the indices for the statute from the disk. If no indices file is found, sets the indices to empty dictionaries, and shows a warning."""
+        """Opens the index file for the statute.  The indices are only decoded from the file when first needed (see getSLDict, getSectionNameDict and getLinkDict).  If no index file is found, or it cannot be read, the indices are set to empty dictionaries as they are needed, with a warning."""
+        self.indexLoaded = True
+        self.indexFile = None
         if not os.path.exists(self.getIndexName()):
             showError("["+self.name+"] Could not find index file for statute")
         else:
             try:
-                f = file(self.getIndexName(),"rb")
-                self.sLDict, self.sectionNameDict, self.linkDict = pickle.load(f)
-                f.close()
+                self.indexFile = StatuteIndexFile.IndexFile(self.getIndexName())
             except IOError:
                 showError("["+self.name+"] Error opening index file for statute")
+            except StatuteIndexFile.IndexFileException, e:
+                showError("["+self.name+"] " + str(e))
                 pass
             pass
-        if self.sLDict is None: showError("["+self.name+"] No slDict, setting to {}"); self.sLDict = {}
-        if self.sectionNameDict is None: showError("[" + self.name + "] No sectionNameDict, setting to {}"); self.sectionNameDict = {}
-        if self.linkDict is None: showError("[" + self.name + "] No linksDict, setting to {}"); self.linkDict = {}
         return
+    def getSLDict(self):
+        """Returns the sLDict for the statute, decoding it from the index file if it has not been set.
+        @rtype: dict
+        """
+        if self.sLDict is None:
+            if self.indexFile is not None: self.sLDict = self.indexFile.getSLDict()
+            if self.sLDict is None: showError("["+self.name+"] No slDict, setting to {}"); self.sLDict = {}
+            pass
+        return self.sLDict
+    def getSectionNameDict(self):
+        """Returns the sectionNameDict for the statute, decoding it from the index file if it has not been set.
+        @rtype: dict
+        """
+        if self.sectionNameDict is None:
+            if self.indexFile is not None: self.sectionNameDict = self.indexFile.getSectionNameDict()
+            if self.sectionNameDict is None: showError("[" + self.name + "] No sectionNameDict, setting to {}"); self.sectionNameDict = {}
+            pass
+        return self.sectionNameDict
+    def getLinkDict(self):
+        """Returns the linkDict for the statute, decoding it from the index file if it has not been set.
+        @rtype: dict
+        """
+        if self.linkDict is None:
+            if self.indexFile is not None: self.linkDict = self.indexFile.getLinkDict()
+            if self.linkDict is None: showError("[" + self.name + "] No linksDict, setting to {}"); self.linkDict = {}
+            pass
+        return self.linkDict
+
+    def getSLPosition(self,sL):
+        """Returns the ordinal position of the sL in the statute, or None if it is not known.
+        @type sL: SectionLabelLib.SectionLabel
+        @rtype: int
+        """
+        if self.sLDict is None and self.getIndexDB() is not None: return self.indexDB.getSLPosition(self.name,sL)
+        if self.sLDict is None and not self.indexLoaded: self.loadIndices()
+        return self.getSLDict().get(sL)
+    def getDefinitionsAt(self,position):
+        """Returns a list of (defined term, sL of definition) for the defined terms applying at the position in the statute.  Defined terms are only kept in the index database, so this is empty if the database is not in use and the statute has not been processed.
+        @type position: int
+        @rtype: list of (unicode, SectionLabelLib.SectionLabel)
+        """
+        if self.definitionRanges is None:
+            if self.getIndexDB() is not None: return self.indexDB.getDefinitionsAt(self.name,position)
+            return []
+        d = {}
+        for term, sL, intervals in self.definitionRanges:
+            if intervals is None or any(start <= position <= end for start, end in intervals): d[(term,sL)] = None
+            pass
+        l = d.keys()
+        l.sort(key=lambda x:x[0])
+        return l
 
     def getLinksToSL(self,targetSL, statuteName=None,errorLocation=None):
         """Returns a list of sL's from this statute that link to the specified sL in statuteName (if statuteName is None, then returns local links).
@@ -297,12 +437,14 @@ class StatuteData(object):
         @type statuteName: str
         @rtype: list of SectionLabelLib.SectionLabel
         """
-        if self.sectionNameDict is None: showError("Call to getLinksToSL before self.sectionNameDict is set. Loading indices.",location=errorLocation); self.loadIndices()
-
         if statuteName is None: statuteName = self.getName()
+        if self.linkDict is None and self.getIndexDB() is not None: return self.indexDB.getLinksToSL(self.name,statuteName,targetSL)
 
-        if statuteName in self.linkDict:
-            sLDict = self.linkDict[statuteName]
+        if self.linkDict is None and not self.indexLoaded: showError("Call to getLinksToSL before self.linkDict is set. Loading indices.",location=errorLocation); self.loadIndices()
+        linkDict = self.getLinkDict()
+
+        if statuteName in linkDict:
+            sLDict = linkDict[statuteName]
         else: return []
         if targetSL in sLDict:
             ll = sLDict[targetSL]
@@ -320,15 +462,21 @@ class StatuteData(object):
         """Returns the SL (if any) represented by the string in the Statute.  If locationSL is specified, and the sLString is not found in the label dictionary, then additional searches are made pre-pending portions of locationSL.
         @rtype: SectionLabelLib.SectionLabel
         """
-        if self.sectionNameDict is None: showError("Call to getSLFromString before self.sectionNameDict is set. Loading indices.",location=errorLocation); self.loadIndices()
-        if sLString in self.sectionNameDict: return self.sectionNameDict[sLString]
-        if locationSL is None: showError("Could not locate sectionlabel string ["+sLString+"] in statute ["+ self.name + "]",location=errorLocation); return None
+        if self.sectionNameDict is None and self.getIndexDB() is not None: lookUp = lambda name: self.indexDB.getSL(self.name,name) #query the database rather than loading the whole dictionary
+        else:
+            if self.sectionNameDict is None and not self.indexLoaded: showError("Call to getSLFromString before self.sectionNameDict is set. Loading indices.",location=errorLocation); self.loadIndices()
+            lookUp = self.getSectionNameDict().get
+            pass
+        sL = lookUp(sLString)
+        if sL is not None: return sL
+        if locationSL is None: showError("Could not locate sectionlabel string [%s] in statute [%s]",location=errorLocation,category="unlocatedLabel",args=(sLString,self.name)); return None
 
         for subLabel in locationSL.getSubLabels():
             #print(">>" + subLabel.getIDString() + sLString)
-            if (subLabel.getIDString() + sLString) in self.sectionNameDict: return self.sectionNameDict[subLabel.getIDString() + sLString]
+            sL = lookUp(subLabel.getIDString() + sLString)
+            if sL is not None: return sL
             pass
-        showError("Could not locate sectionlabel string ["+sLString+"] in statute ["+ self.name + "] [hint:"+locationSL.getIDString()+"]",location=errorLocation)
+        showError("Could not locate sectionlabel string [%s] in statute [%s] [hint:%s]",location=errorLocation,category="unlocatedLabel",args=(sLString,self.name,locationSL.getIDString()))
         return None
     def getPinpointFromString(self, sLString, locationSL,errorLocation=None):
         """Returns a Pinpoint object for the given sectionLabel string in this statute.  Returns None, None, None if nothing found.
@@ -0,0 +1,177 @@
+# Copyright (C) 2022  Ian Caines
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Module for storing the indices of statutes in a shared SQLite database, as an alternative to the per-statute index files (see StatuteIndexFile).
+
+The database is used by StatuteIndex when Constants.INDEXDBFILE is set.  Each statute's indices are replaced in a single transaction when the statute is processed, and the database is kept in WAL mode, so any number of processes can query it while another one is writing.
+
+Tables (SectionLabels are stored as text keys, see encodeLabel):
+statutes - name of each statute stored, and when it was stored.
+sections - the sectionNameDict, as (statute, name, label).
+positions - the sLDict, as (statute, label, position).
+definitions - defined terms, as (statute, term, label, startPos, endPos), with one row for each position interval in the term's application range (startPos and endPos are NULL if the term applies to the whole statute).
+links - the linkDict, as (statute, target statute, target label, seq, source label), where seq gives the order of the sources for each target.
+"""
+
+import sqlite3, datetime
+import SectionLabelLib
+
+class IndexDBException(Exception): pass
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS statutes (statute TEXT PRIMARY KEY, stored TEXT);
+CREATE TABLE IF NOT EXISTS sections (statute TEXT, name TEXT, label TEXT, PRIMARY KEY (statute, name));
+CREATE TABLE IF NOT EXISTS positions (statute TEXT, label TEXT, position INTEGER, PRIMARY KEY (statute, label));
+CREATE TABLE IF NOT EXISTS definitions (statute TEXT, term TEXT, label TEXT, startPos INTEGER, endPos INTEGER);
+CREATE INDEX IF NOT EXISTS definitionTermIndex ON definitions (statute, term);
+CREATE INDEX IF NOT EXISTS definitionStartIndex ON definitions (statute, startPos);
+CREATE TABLE IF NOT EXISTS links (statute TEXT, targetStatute TEXT, targetLabel TEXT, seq INTEGER, sourceLabel TEXT);
+CREATE INDEX IF NOT EXISTS linkTargetIndex ON links (targetStatute, targetLabel, statute, seq);
+"""
+
+#separators used in the text keys for SectionLabels (control characters, so they cannot appear in label strings)
+NUMBERINGSEP = u"\x1e"
+TYPESEP = u"\x1f"
+
+def encodeLabel(sL):
+    """Returns the text key representing the SectionLabel in the database.
+    @type sL: SectionLabelLib.SectionLabel
+    @rtype: unicode
+    """
+    return NUMBERINGSEP.join(unicode(n.getSectionType()) + TYPESEP + unicode(n.getLabelString()) for n in sL.getNumberings())
+
+def decodeLabel(key):
+    """Returns the SectionLabel represented by the text key.
+    @rtype: SectionLabelLib.SectionLabel
+    """
+    numberings = []
+    if key != u"":
+        for part in key.split(NUMBERINGSEP):
+            sectionType, labelString = part.split(TYPESEP)
+            numberings.append(SectionLabelLib.makeNumbering(sectionType=sectionType,labelString=labelString))
+            pass
+        pass
+    return SectionLabelLib.SectionLabel(numberings=numberings)
+
+class IndexDB(object):
+    """Connection to the index database.  Each process should open its own IndexDB, which may be used by any of its threads, one at a time."""
+    def __init__(self,fname,timeout=30.0):
+        """
+        fname - filename of the database, which is created if it does not exist
+        timeout - number of seconds to wait for another process's write to finish
+        """
+        self.fname = fname
+        try:
+            self.connection = sqlite3.connect(fname,timeout=timeout,check_same_thread=False) #may be used from another thread (e.g., a StatuteService request reprocessing a statute), but only by one thread at a time
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SCHEMA)
+        except sqlite3.Error, e:
+            raise IndexDBException("Could not open index database " + fname + ": " + str(e))
+        self.labels = {} #SectionLabels decoded so far, indexed by text key
+        return
+    def close(self):
+        self.connection.close()
+        return
+    def getLabel(self,key):
+        """Returns the SectionLabel for the text key, reusing the SectionLabels already decoded."""
+        if key not in self.labels: self.labels[key] = decodeLabel(key)
+        return self.labels[key]
+
+    ###
+    # Storing indices
+    ###
+
+    def storeStatute(self,statuteName,sLDict,sectionNameDict,linkDict,definitionRanges):
+        """Replaces the indices stored for the statute.  Any of the indices may be None, in which case nothing is stored for it.
+        definitionRanges - list of (defined term, sL of definition, list of (start, end) position intervals, or None if the term applies throughout the statute)
+        """
+        statuteName = unicode(statuteName)
+        c = self.connection
+        with c:
+            for table in ["statutes","sections","positions","definitions","links"]: c.execute("DELETE FROM " + table + " WHERE statute=?", (statuteName,))
+            c.execute("INSERT INTO statutes VALUES (?,?)", (statuteName,datetime.datetime.today().isoformat()))
+            if sectionNameDict is not None:
+                c.executemany("INSERT INTO sections VALUES (?,?,?)", ((statuteName,unicode(name),encodeLabel(sL)) for name, sL in sectionNameDict.iteritems()))
+                pass
+            if sLDict is not None:
+                c.executemany("INSERT INTO positions VALUES (?,?,?)", ((statuteName,encodeLabel(sL),position) for sL, position in sLDict.iteritems()))
+                pass
+            if definitionRanges is not None:
+                rows = []
+                for term, sL, intervals in definitionRanges:
+                    if intervals is None: rows.append((statuteName,unicode(term),encodeLabel(sL),None,None))
+                    else: rows += [(statuteName,unicode(term),encodeLabel(sL),start,end) for start, end in intervals]
+                    pass
+                c.executemany("INSERT INTO definitions VALUES (?,?,?,?,?)", rows)
+                pass
+            if linkDict is not None:
+                rows = []
+                for targetStatuteName, targetDict in linkDict.iteritems():
+                    for targetSL, sourceList in targetDict.iteritems():
+                        targetKey = encodeLabel(targetSL)
+                        rows += [(statuteName,unicode(targetStatuteName),targetKey,seq,encodeLabel(sourceSL)) for seq, sourceSL in enumerate(sourceList)]
+                        pass
+                    pass
+                c.executemany("INSERT INTO links VALUES (?,?,?,?,?)", rows)
+                pass
+            pass
+        return
+
+    ###
+    # Queries
+    ###
+
+    def hasStatute(self,statuteName):
+        """Returns True if indices have been stored for the statute."""
+        return self.connection.execute("SELECT 1 FROM statutes WHERE statute=?", (unicode(statuteName),)).fetchone() is not None
+    def getSL(self,statuteName,sectionName):
+        """Returns the SectionLabel with the given name (IDString) in the statute, or None if there is none.
+        @rtype: SectionLabelLib.SectionLabel
+        """
+        row = self.connection.execute("SELECT label FROM sections WHERE statute=? AND name=?", (unicode(statuteName),unicode(sectionName))).fetchone()
+        if row is None: return None
+        return self.getLabel(row[0])
+    def getSLPosition(self,statuteName,sL):
+        """Returns the position of the SectionLabel in the statute, or None if it is not known.
+        @rtype: int
+        """
+        row = self.connection.execute("SELECT position FROM positions WHERE statute=? AND label=?", (unicode(statuteName),encodeLabel(sL))).fetchone()
+        if row is None: return None
+        return row[0]
+    def getLinksToSL(self,statuteName,targetStatuteName,targetSL):
+        """Returns the list of SectionLabels in the statute that link to targetSL in targetStatuteName.
+        @rtype: list of SectionLabelLib.SectionLabel
+        """
+        rows = self.connection.execute("SELECT sourceLabel FROM links WHERE targetStatute=? AND targetLabel=? AND statute=? ORDER BY seq", (unicode(targetStatuteName),encodeLabel(targetSL),unicode(statuteName)))
+        return [self.getLabel(row[0]) for row in rows]
+    def getCitations(self,targetStatuteName,targetSL):
+        """Returns a list of (statute name, SectionLabel) for every section in any statute that links to targetSL in targetStatuteName.
+        @rtype: list of (unicode, SectionLabelLib.SectionLabel)
+        """
+        rows = self.connection.execute("SELECT statute, sourceLabel FROM links WHERE targetStatute=? AND targetLabel=? ORDER BY statute, seq", (unicode(targetStatuteName),encodeLabel(targetSL)))
+        return [(row[0],self.getLabel(row[1])) for row in rows]
+    def getDefinitionsAt(self,statuteName,position):
+        """Returns a list of (defined term, sL of definition) for the defined terms that apply at the position in the statute.
+        @rtype: list of (unicode, SectionLabelLib.SectionLabel)
+        """
+        rows = self.connection.execute("SELECT DISTINCT term, label FROM definitions WHERE statute=? AND (startPos IS NULL OR (startPos <= ? AND endPos >= ?)) ORDER BY term", (unicode(statuteName),position,position))
+        return [(row[0],self.getLabel(row[1])) for row in rows]
+    def getDefinitions(self,statuteName,term):
+        """Returns the list of SectionLabels of the definitions of the term in the statute.
+        @rtype: list of SectionLabelLib.SectionLabel
+        """
+        rows = self.connection.execute("SELECT DISTINCT label FROM definitions WHERE statute=? AND term=?", (unicode(statuteName),unicode(term.lower())))
+        return [self.getLabel(row[0]) for row in rows]
+    pass
@@ -0,0 +1,202 @@
+# Copyright (C) 2022  Ian Caines
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Module for writing and reading the index files of statutes (the sLDict, sectionNameDict and linkDict of StatuteIndex.StatuteData).
+
+File format (version 1):
+The file starts with a header (magic string, version number, number of blocks), followed by a directory giving the name, offset and length of each block.  All integers are little-endian 32-bit.
+STRS - table of all strings in the file (section types, label strings, section names, statute names), UTF-8 encoded and separated by null characters.
+LABS - for each SectionLabel, the position of its first numbering in LNUM (with one extra entry marking the end).
+LNUM - the numberings of the SectionLabels, as (section type, label string) pairs of string numbers.
+NAME - the sectionNameDict, as (section name, SectionLabel number) pairs.
+POSN - the sLDict, as (SectionLabel number, position) pairs.
+LINK - the linkDict, as a list: for each statute, its name, the number of targets, and then for each target SectionLabel, its number, the number of sources and the source SectionLabel numbers.
+Blocks for dictionaries that were not set (None) are left out.  Each dictionary is only decoded when asked for, and SectionLabels are only built as they are needed, so looking up sectionNameDict does not require decoding linkDict.
+"""
+
+import struct, array, sys
+import SectionLabelLib
+
+class IndexFileException(Exception): pass
+
+MAGIC = "STATIDX\x00"
+VERSION = 1
+headerStruct = struct.Struct("<8sII") #magic, version, number of blocks
+blockStruct = struct.Struct("<4sII") #block name, offset, length
+
+def packInts(values):
+    """Returns the string of little-endian 32-bit integers representing values."""
+    a = array.array("i",values)
+    if sys.byteorder == "big": a.byteswap()
+    return a.tostring()
+
+def unpackInts(data):
+    """Returns an array of the little-endian 32-bit integers in data.
+    @rtype: array.array
+    """
+    a = array.array("i")
+    a.fromstring(data)
+    if sys.byteorder == "big": a.byteswap()
+    return a
+
+class IndexFileWriter(object):
+    """Object that collects the string and SectionLabel tables while the dictionaries are encoded."""
+    def __init__(self):
+        self.strings = []
+        self.stringNumbers = {}
+        self.labelStarts = []
+        self.labelNumberings = []
+        self.labelNumbers = {}
+        return
+    def addString(self,s):
+        """Returns the number of the string in the string table, adding it if necessary."""
+        if s not in self.stringNumbers:
+            self.stringNumbers[s] = len(self.strings)
+            self.strings.append(s)
+            pass
+        return self.stringNumbers[s]
+    def addLabel(self,sL):
+        """Returns the number of the SectionLabel in the label table, adding it if necessary.
+        @type sL: SectionLabelLib.SectionLabel
+        """
+        if sL not in self.labelNumbers:
+            self.labelNumbers[sL] = len(self.labelStarts)
+            self.labelStarts.append(len(self.labelNumberings)/2)
+            for numbering in sL.getNumberings():
+                self.labelNumberings.append(self.addString(numbering.getSectionType()))
+                self.labelNumberings.append(self.addString(numbering.getLabelString()))
+                pass
+            pass
+        return self.labelNumbers[sL]
+    def encodeDictionaries(self,sLDict,sectionNameDict,linkDict):
+        """Returns a list of (block name, data) for the given dictionaries, including the string and label tables."""
+        blocks = []
+        if sectionNameDict is not None:
+            values = []
+            for name, sL in sectionNameDict.iteritems(): values.append(self.addString(name)); values.append(self.addLabel(sL))
+            blocks.append(("NAME",packInts(values)))
+            pass
+        if sLDict is not None:
+            values = []
+            for sL, position in sLDict.iteritems(): values.append(self.addLabel(sL)); values.append(position)
+            blocks.append(("POSN",packInts(values)))
+            pass
+        if linkDict is not None:
+            values = []
+            for statuteName, targetDict in linkDict.iteritems():
+                values.append(self.addString(statuteName))
+                values.append(len(targetDict))
+                for targetSL, sourceList in targetDict.iteritems():
+                    values.append(self.addLabel(targetSL))
+                    values.append(len(sourceList))
+                    for sourceSL in sourceList: values.append(self.addLabel(sourceSL))
+                    pass
+                pass
+            blocks.append(("LINK",packInts(values)))
+            pass
+        tables = [("STRS",u"\x00".join(unicode(s) for s in self.strings).encode("utf-8")), ("LABS",packInts(self.labelStarts + [len(self.labelNumberings)/2])), ("LNUM",packInts(self.labelNumberings))]
+        return tables + blocks
+
+def writeIndexFile(fname,sLDict,sectionNameDict,linkDict):
+    """Writes the dictionaries to the named index file.  Any of the dictionaries may be None."""
+    blocks = IndexFileWriter().encodeDictionaries(sLDict,sectionNameDict,linkDict)
+    offset = headerStruct.size + blockStruct.size * len(blocks)
+    parts = [headerStruct.pack(MAGIC,VERSION,len(blocks))]
+    for name, data in blocks:
+        parts.append(blockStruct.pack(name,offset,len(data)))
+        offset += len(data)
+        pass
+    parts += [data for name, data in blocks]
+    f = file(fname,"wb")
+    f.write("".join(parts))
+    f.close()
+    return
+
+class IndexFile(object):
+    """An index file that has been read from disk.  The blocks are decoded as they are needed."""
+    def __init__(self,fname):
+        f = file(fname,"rb"); self.data = f.read(); f.close()
+        if len(self.data) < headerStruct.size: raise IndexFileException("Index file too short: " + fname)
+        magic, version, count = headerStruct.unpack_from(self.data,0)
+        if magic != MAGIC: raise IndexFileException("Not an index file (may be from an older version): " + fname)
+        if version != VERSION: raise IndexFileException("Unsupported index file version " + str(version) + ": " + fname)
+        self.blocks = {}
+        for n in xrange(count):
+            name, offset, length = blockStruct.unpack_from(self.data,headerStruct.size + n * blockStruct.size)
+            self.blocks[name] = (offset,length)
+            pass
+        self.strings = None
+        self.labelStarts = None
+        self.labelNumberings = None
+        self.labels = {} #SectionLabel objects built so far, indexed by number
+        return
+    def hasBlock(self,name): return name in self.blocks
+    def getBlock(self,name):
+        """Returns the raw data of the named block."""
+        offset, length = self.blocks[name]
+        return self.data[offset:offset+length]
+    def getString(self,n):
+        if self.strings is None: self.strings = self.getBlock("STRS").decode("utf-8").split(u"\x00")
+        return self.strings[n]
+    def getLabel(self,n):
+        """Returns SectionLabel number n.
+        @rtype: SectionLabelLib.SectionLabel
+        """
+        if n in self.labels: return self.labels[n]
+        if self.labelStarts is None:
+            self.labelStarts = unpackInts(self.getBlock("LABS"))
+            self.labelNumberings = unpackInts(self.getBlock("LNUM"))
+            pass
+        numberings = []
+        for k in xrange(self.labelStarts[n],self.labelStarts[n+1]):
+            numberings.append(SectionLabelLib.makeNumbering(sectionType=self.getString(self.labelNumberings[2*k]),labelString=self.getString(self.labelNumberings[2*k+1])))
+            pass
+        sL = SectionLabelLib.SectionLabel(numberings=numberings)
+        self.labels[n] = sL
+        return sL
+    def getSectionNameDict(self):
+        """Returns the sectionNameDict stored in the file, or None if there is none.
+        @rtype: dict
+        """
+        if not self.hasBlock("NAME"): return None
+        values = unpackInts(self.getBlock("NAME"))
+        return dict((self.getString(values[k]), self.getLabel(values[k+1])) for k in xrange(0,len(values),2))
+    def getSLDict(self):
+        """Returns the sLDict stored in the file, or None if there is none.
+        @rtype: dict
+        """
+        if not self.hasBlock("POSN"): return None
+        values = unpackInts(self.getBlock("POSN"))
+        return dict((self.getLabel(values[k]), values[k+1]) for k in xrange(0,len(values),2))
+    def getLinkDict(self):
+        """Returns the linkDict stored in the file, or None if there is none.
+        @rtype: dict
+        """
+        if not self.hasBlock("LINK"): return None
+        values = unpackInts(self.getBlock("LINK"))
+        linkDict = {}
+        k = 0
+        while k < len(values):
+            targetDict = {}
+            linkDict[self.getString(values[k])] = targetDict
+            targetCount = values[k+1]
+            k += 2
+            for n in xrange(targetCount):
+                sourceCount = values[k+1]
+                targetDict[self.getLabel(values[k])] = [self.getLabel(c) for c in values[k+2:k+2+sourceCount]]
+                k += 2 + sourceCount
+                pass
+            pass
+        return linkDict
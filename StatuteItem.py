@@ -37,6 +37,16 @@ class BaseItem(StatutePart):
         self.tree = tree  #the top node in the tree corresponding to this item
         self.items = []   #list of immediate subitems for this item
         return
+    def __getstate__(self):
+        """The XML tree is not stored in snapshots (see Statute.storeSnapshot)."""
+        state = self.__dict__.copy()
+        state["tree"] = None
+        return state
+    def releaseTree(self):
+        """Drops the references of this item and its subitems to their XML nodes, once they have been constructed (see Statute lean mode)."""
+        self.tree = None
+        for subitem in self.items: subitem.releaseTree()
+        return
     def getStatute(self): return self.statute #statute with which item is associated
     def getIndentLevel(self): return self.parent.getIndentLevel()
     def itemIterator(self):
@@ -69,7 +79,19 @@ class BaseItem(StatutePart):
         for p in paragraphs[1:]:
             if not mergedParagraphs[-1].merge(p): mergedParagraphs.append(p)
             pass
-        return "\n".join(p.getRenderedText(baseLevel=baseLevel) for p in mergedParagraphs)
+        return renderContext.joinText((p.getRenderedText(baseLevel=baseLevel) for p in mergedParagraphs),"\n")
+    def writeRenderedText(self,writer,renderContext,skipLabel=False,baseLevel=0):
+        """Writes the same text as getRenderedText to writer (a RenderContext.PageWriter), a paragraph at a time.
+        @type writer: RenderContext.PageWriter
+        """
+        paragraphs = self.getParagraphs(renderContext,skipLabel=skipLabel)
+        mergedParagraphs = [paragraphs[0]]
+        for p in paragraphs[1:]:
+            if not mergedParagraphs[-1].merge(p): mergedParagraphs.append(p)
+            pass
+        writer.write(mergedParagraphs[0].getRenderedText(baseLevel=baseLevel))
+        for p in mergedParagraphs[1:]: writer.write("\n",p.getRenderedText(baseLevel=baseLevel))
+        return
     def getParagraphs(self, renderContext, skipLabel=False):
         """Get list of paragraph text-blocks for this item, rendered according to the current context.  Gets overridden in certain subclasses to reflect different paragraph breakdown (e.g., in TextItems)"""
         return self.getSubParagraphs(renderContext)
@@ -97,7 +119,7 @@ class BaseItem(StatutePart):
                 pass
             elif isinstance(child,XMLStatParse.TextNode): #raise an exception if we are ignoring any raw text
                 if child.getRawText().strip() != "": showError("Text appearing directly in a section: ["+child.getRawText()+"]",location=self)
-            else: showError("Unknown tag: [" + repr(child) + "]", location=self)
+            else: showError("Unknown tag: [%r]", location=self, category="unknownTag", args=(child,))
             pass
         return
     def __repr__(self):
@@ -212,7 +234,7 @@ class SectionItem(BaseItem):
         currentSL = self.getImmediateSectionLabel()
         if currentSL is not None: #compare with SL derived from the xml tag, if one exists, and show error on mismatch
             if not currentSL.quasiEqual(imputedSL):
-                showError("Inconsistent labelling, Current:["+currentSL.getDisplayString()+"] Imputed["+imputedSL.getDisplayString()+"]",location=self)
+                showError("Inconsistent labelling, Current:[%s] Imputed[%s]",location=self,category="inconsistentLabel",args=(currentSL.getDisplayString(),imputedSL.getDisplayString()))
                 pass
         else: #otherwise use the imputed SL
             self.sectionLabel = imputedSL
@@ -225,7 +247,7 @@ class SectionItem(BaseItem):
         @rtype: SectionLabelLib.SectionLabel"""
         if self.sectionLabel != None: return self.sectionLabel #the section label object pinpointing this provision
         if self.finalizedLabel:
-            showError("SectionItem lacking immediate label ["+self.tree.tag+"]", location = self.parent) #if label finalized, no reason not to have sectionLAbel
+            showError("SectionItem lacking immediate label ["+(self.tree.tag if self.tree is not None else "")+"]", location = self.parent) #if label finalized, no reason not to have sectionLAbel
         return None
     def getLabelString(self): return self.labelString #the top-level string tag labeling this provision (appearing at the start of text)
     def getIndentLevel(self):
@@ -430,15 +452,13 @@ class ReadAsItem(BaseItem):
 
 class TextItem(BaseItem):
     """Class for a blob of text, possibly with embedded links and other decorations.  Is called on nodes of the tree which just embed text, and not further subsection.
-    Text inside the TextItem is stored as a linked list of Piece objects."""
+    Text inside the TextItem is collected by a TextAssembler, and stored as a DecoratedText."""
     def __init__(self,parent,tree,forceNewParagraph = False):
         BaseItem.__init__(self,parent,tree)
         self.forceNewParagraph = forceNewParagraph #force this TextItem to start a new paragraph
-        self.firstPiece = textutil.Piece(self,isSpaced=False) #dummy piece to start linked list
-        self.lastPiece = self.firstPiece
-        self.processTree(self.tree)
-        self.decoratedText = self.firstPiece.assembleText()
-        #self.text, self.decorators = self.firstPiece.assembleText()
+        assembler = textutil.TextAssembler(self) #collects the spans of text while walking the tree
+        self.processTree(self.tree,assembler)
+        self.decoratedText = assembler.assembleText()
         self.definedTerms = self.decoratedText.getDefinedTerms() #list of defined terms appearing in this text block
         #TODO: extract defined terms from the applicable decorators
         return
@@ -448,33 +468,31 @@ class TextItem(BaseItem):
         for tag in stack:
             if tag in textTriggers: return True
         return False
-    def addPiece(self,piece):
-        """Adds a new piece after the current last piece."""
-        self.lastPiece.setNextPiece(piece)
-        self.lastPiece = piece
-        return
-    def processTree(self,tree,stack=None):
+    def processTree(self,tree,assembler,stack=None):
+        """Walks the tree, adding the text found to the TextAssembler.
+        @type assembler: textutil.TextAssembler
+        """
         if stack is None: stack = [] #create stack on initial call
         if len(stack) > 100: raise StatuteException("Stackoverflow")
         stack.append(tree.tag)
         for item in tree: #iterate over the subitems
             if item.tag == "definedtermen":
-                self.addPiece(textutil.DefinedTermPiece(parent=self,text=item.getSpacedRawText().strip()))
+                assembler.addDefinedTerm(item.getSpacedRawText().strip())
             elif item.tag == "xrefexternal":
-                self.addPiece(textutil.LinkPiece(parent=self,text=item.getSpacedRawText(),pinpoint=None))
+                assembler.addLink(item.getSpacedRawText(),pinpoint=None)
             elif item.tag =="xrefinternal":
-                self.addPiece(textutil.LinkPiece(parent=self,text=item.getSpacedRawText(),pinpoint=None))
+                assembler.addLink(item.getSpacedRawText(),pinpoint=None)
             elif isinstance(item,XMLStatParse.TextNode):  #TextNode correspond to text in the xml file.  Only include if we are inside aof <Text> tags.
                 txt = item.getRawText().strip() #to strip off leading/trailing spaces / new lines
                 if txt == "": continue
-                if self.isWrittenText(stack): self.addPiece(textutil.TextPiece(parent=self,text=txt))
+                if self.isWrittenText(stack): assembler.addText(txt)
                 else:
                     showError("Unprocessed text: [TXT: "+ txt + "][STACK: "+str(stack)+"]",location=self) #if we are ignoring non-trivial text, raise an exception so we know there is more to handle.
                 pass
             elif item.tag in sectionTypes or item.tag in formulaSectionTypes: showError("Found a section label in text: ["+item.tag+"]",location=self)
             else:
                 if item.tag not in knownTextTags: showError("Unknown tag found in text: ["+item.tag+"]", location=self)
-                self.processTree(tree=item,stack=stack) #otherwise recurse down to the contents of this item.
+                self.processTree(tree=item,assembler=assembler,stack=stack) #otherwise recurse down to the contents of this item.
         stack.pop()
         return
     def getText(self):
@@ -490,6 +508,10 @@ class TextItem(BaseItem):
         """Calls the getDecoratedText method on the underlying DecoratedText object, with the supplied RenderContext."""
         return self.decoratedText.getRenderedText(renderContext)
 
+    def writeRenderedText(self,writer,renderContext,skipLabel=False,baseLevel=0):
+        writer.write(self.getRenderedText(renderContext))
+        return
+
     def getParagraphs(self, renderContext, skipLabel=False):
         """Return the rendered text of this item bundled into a list of Paragraph objects."""
         indentLevel = self.getIndentLevel()
@@ -520,6 +542,17 @@ class HeadingItem(StatutePart):
         self.confirmLabel()
         return
 
+    def __getstate__(self):
+        """The XML tree is not stored in snapshots (see Statute.storeSnapshot)."""
+        state = self.__dict__.copy()
+        state["tree"] = None
+        return state
+
+    def releaseTree(self):
+        """Drops the reference to the XML node of the heading (see Statute lean mode)."""
+        self.tree = None
+        return
+
     def processHeadingData(self):
         """Extracts heading information from the tree of the heading node."""
         subsecs = []  # TODO: factor this out into a method that can be overriden for definitions
@@ -581,6 +614,11 @@ class HeadingItem(StatutePart):
 #
 #####
 
+def softSpaceJoin(text,nextText):
+    """Joins the text of a paragraph with a soft space to the text of the next, adding a space only if the next starts with an alphanumeric character."""
+    spacer = (u" " if (len(nextText) > 0 and nextText[0].isalnum()) else u"")
+    return text + spacer + nextText
+
 class Paragraph(object):
     """Class for encapsulating a (part of a) paragraph of rendered text, along with logic for determining when paragraphs can be connected, and outputting final results."""
     def __init__(self,text, renderContext,indentLevel = 0,isMarginalNote = False, forceNewParagraph=False, softSpace=False):
@@ -603,9 +641,8 @@ class Paragraph(object):
         if self.isMarginalNote or nextParagraph.isMarginalNote: return False #marginal notes can't be merged
         if self.indentLevel != nextParagraph.indentLevel: return False
         #TODO - when merging a length-0 paragraph, we should presumably maintain our softSpace rule (or do an "or"?).  There shouldn't be length-0 paragraphs though.
-        if self.softSpace: spacer = (u" " if (len(nextParagraph.text) > 0 and nextParagraph.text[0].isalnum()) else u"")
-        else: spacer = u""
-        self.text += spacer + nextParagraph.text
+        if self.softSpace: self.text = self.renderContext.mapText(softSpaceJoin,self.text,nextParagraph.text) #text may differ between contexts (see RenderContext.MultiContext), so the spacer is decided for each
+        else: self.text += nextParagraph.text
         self.softSpace = nextParagraph.softSpace
         return True
     def getRenderedText(self, baseLevel = 0):
@@ -0,0 +1,130 @@
+# Copyright (C) 2022  Ian Caines
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Local HTTP server standing in for the justice website, so that the code in StatuteFetch can be tried without going online.
+
+The server serves the statutes in a directory: each file [name].xml (raw XML) or [name].bundle (a statute bundle) is available as
+/eng/acts/[name]/index.html - an index page in the style of the justice website, giving the currency and amendment dates and a link to the XML
+/eng/XML/[name].xml - the XML of the statute
+The dates are taken from the bundle metadata, or the modification date of an XML file, unless they are set with setDates.  Index pages are sent with ETag (a hash of the page) and Last-Modified (the modification time of the file) headers, and conditional requests for an unchanged page are answered with 304 (not modified).  Connections are kept alive between requests, and each connection is handled in its own thread (see LocalServer).
+"""
+
+import os, sys, re, time, datetime, hashlib, email.utils
+import StatuteFetch, LocalServer
+
+indexPathPat = re.compile("^/eng/acts/(?P<name>[^/]+)/(index\.html)?$")
+xmlPathPat = re.compile("^/eng/XML/(?P<name>[^/]+)\.xml$")
+
+indexTemplate = """<html lang="en"><head><meta charset="utf-8"></meta><title>%(name)s</title></head><body>
+<p>Full Document: <a href="/eng/XML/%(name)s.xml">XML</a></p>
+<p>The Act is current to %(currency)s and last amended on %(amend)s. Previous Versions</p>
+</body></html>
+"""
+
+class StatuteRequestHandler(LocalServer.LocalRequestHandler):
+    def do_GET(self):
+        indexm = indexPathPat.match(self.path)
+        xmlm = xmlPathPat.match(self.path)
+        if indexm is not None and self.server.hasStatute(indexm.group("name")): self.sendIndexPage(indexm.group("name"))
+        elif xmlm is not None and self.server.hasStatute(xmlm.group("name")): self.sendData(self.server.getXML(xmlm.group("name")),"application/xml")
+        else: self.send_error(404)
+        return
+    def sendIndexPage(self,name):
+        page = self.server.getIndexPage(name)
+        etag = "\"" + hashlib.md5(page).hexdigest() + "\""
+        lastModified = self.server.getLastModified(name)
+        validators = [("ETag",etag), ("Last-Modified",lastModified)]
+        ifNoneMatch = self.headers.getheader("if-none-match")
+        ifModifiedSince = self.headers.getheader("if-modified-since")
+        if ifNoneMatch is not None: notModified = (ifNoneMatch == etag) #If-None-Match takes precedence over If-Modified-Since
+        else: notModified = (ifModifiedSince == lastModified)
+        if notModified:
+            self.server.notModifiedCount += 1
+            self.send_response(304)
+            for header, value in validators: self.send_header(header,value)
+            self.send_header("Content-Length","0")
+            self.end_headers()
+            return
+        self.sendData(page,"text/html; charset=utf-8",validators)
+        return
+    pass
+
+class StatuteServer(LocalServer.LocalServer):
+    """Server for the statutes in statuteDir.  If port is 0, a free port is chosen (see getPort)."""
+    def __init__(self,statuteDir="Statutes",port=0,verbose=False):
+        LocalServer.LocalServer.__init__(self,StatuteRequestHandler,port=port,verbose=verbose)
+        self.statuteDir = statuteDir
+        self.dates = {} #(currency date, amendment date) for statutes whose dates have been set with setDates
+        self.dateTimes = {} #time at which the dates were set, for statutes in self.dates
+        self.connectionCount = 0 #number of connections accepted
+        self.notModifiedCount = 0 #number of 304 responses sent
+        return
+    def process_request(self,request,client_address):
+        self.connectionCount += 1
+        LocalServer.LocalServer.process_request(self,request,client_address)
+        return
+    def getURL(self,name):
+        """Returns the url of the index page for the named statute."""
+        return "http://127.0.0.1:" + str(self.getPort()) + "/eng/acts/" + name + "/index.html"
+    def getStatuteNames(self):
+        names = [os.path.splitext(c)[0] for c in os.listdir(self.statuteDir) if os.path.splitext(c)[1] in (".xml",".bundle")]
+        names.sort()
+        return names
+    def getFileName(self,name):
+        """Returns the file for the named statute (preferring a bundle), or None if there is none."""
+        for ext in (".bundle",".xml"):
+            fname = os.path.join(self.statuteDir, name + ext)
+            if os.path.exists(fname): return fname
+            pass
+        return None
+    def hasStatute(self,name): return self.getFileName(name) is not None
+    def setDates(self,name,currency,amend):
+        """Sets the currency and amendment dates reported for the named statute (e.g., to simulate an amendment)."""
+        self.dates[name] = (currency,amend)
+        self.dateTimes[name] = time.time()
+        return
+    def getDates(self,name):
+        """Returns (currency date, amendment date) for the named statute."""
+        if name in self.dates: return self.dates[name]
+        fname = self.getFileName(name)
+        if fname.endswith(".bundle"):
+            metadata = StatuteFetch.openStatuteMetadata(fname)
+            return metadata["CURRENCY"], metadata["AMEND"]
+        date = datetime.date.fromtimestamp(os.path.getmtime(fname))
+        return date, date
+    def getLastModified(self,name):
+        """Returns the Last-Modified header value for the index page of the named statute."""
+        if name in self.dateTimes: modified = self.dateTimes[name]
+        else: modified = os.path.getmtime(self.getFileName(name))
+        return email.utils.formatdate(modified,usegmt=True)
+    def getIndexPage(self,name):
+        currency, amend = self.getDates(name)
+        return indexTemplate % {"name": name, "currency": currency.isoformat(), "amend": amend.isoformat()}
+    def getXML(self,name):
+        fname = self.getFileName(name)
+        if fname.endswith(".bundle"): return StatuteFetch.openStatuteXML(fname)
+        f = open(fname,"rb"); data = f.read(); f.close()
+        return data
+    pass
+
+#testing
+if __name__ == "__main__":
+    port = 8000
+    if len(sys.argv) > 1: port = int(sys.argv[1])
+    statuteDir = "Statutes"
+    if len(sys.argv) > 2: statuteDir = sys.argv[2]
+    server = StatuteServer(statuteDir=statuteDir,port=port,verbose=True)
+    for name in server.getStatuteNames(): print(server.getURL(name))
+    server.serve_forever()
@@ -0,0 +1,235 @@
+# Copyright (C) 2022  Ian Caines
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Long-running service answering queries about statutes, as an alternative to rendering every page in a batch (as in test.py).
+
+The statutes are processed (or loaded from their snapshots, see Statute.loadSnapshot) once, and kept in memory with their StatuteIndex, SectionData and link indices.  The service then answers, over HTTP on a local port:
+/section?statute=[name]&label=[label] - the page for a top-level section (e.g., label=12.1), rendered on demand and kept in an LRU cache of pages
+/resolve?statute=[name]&label=[label]&hint=[label] - the section label for a string, as found by StatuteData.getSLFromString (the hint being the location the string appears in), as JSON
+/citing?statute=[name]&label=[label] - the sections, in any loaded statute, citing the given section, as JSON
+/stats - counts of requests, page cache hits and misses, and reloads, as JSON
+Before answering a request, the service checks (at most every checkInterval seconds) whether any statute's bundle file has changed since it was loaded, and if so reloads that statute (and any statute whose Act or Regulations it is) and empties the page cache.
+
+Usage: python StatuteService.py [port] [statute names]
+(by default, port 8080 and every statute in the index)
+"""
+
+import os, sys, time, json, threading, urlparse, collections
+import StatuteIndex, LocalServer
+from ErrorReporter import showError
+
+class StatuteServiceException(Exception): pass
+
+PAGECACHESIZE = 256 #number of rendered pages kept in memory
+CHECKINTERVAL = 5.0 #minimum time (in seconds) between checks for changed bundle files
+
+class PageCache(object):
+    """Bounded cache of rendered pages, discarding the least recently used page when full."""
+    def __init__(self,maxSize=PAGECACHESIZE):
+        self.maxSize = maxSize
+        self.pages = collections.OrderedDict() #in order of use, least recent first
+        self.hits = 0
+        self.misses = 0
+        return
+    def get(self,key):
+        """Returns the page cached under key, or None."""
+        page = self.pages.pop(key,None)
+        if page is None: self.misses += 1; return None
+        self.hits += 1
+        self.pages[key] = page #move to the most recently used end
+        return page
+    def put(self,key,page):
+        self.pages.pop(key,None)
+        self.pages[key] = page
+        if len(self.pages) > self.maxSize: self.pages.popitem(last=False)
+        return
+    def clear(self):
+        self.pages.clear()
+        return
+    def __len__(self): return len(self.pages)
+    pass
+
+class PageCapture(object):
+    """Stand-in for a RenderContext.PageQueue, which keeps the rendered pages in memory instead of writing them."""
+    def __init__(self):
+        self.pages = {} #page path -> (encoded) page
+        self.stallTime = 0.0
+        return
+    def put(self,path,pieces):
+        self.pages[path] = "".join(pieces)
+        return
+    def flush(self): return
+    pass
+
+class StatuteService(object):
+    """Keeps processed statutes in memory, and answers queries about them.  Requests may come from several threads: they are answered one at a time, since rendering uses state kept by the Statute and the render context."""
+    def __init__(self,statuteIndex=None,names=None,cacheSize=PAGECACHESIZE,checkInterval=CHECKINTERVAL):
+        if statuteIndex is None: statuteIndex = StatuteIndex.StatuteIndex()
+        if names is None: names = statuteIndex.getStatuteList()
+        self.statuteIndex = statuteIndex
+        self.names = names
+        self.statutes = {} #name -> processed Statute
+        self.sectionPositions = {} #name -> {top-level label string: position in the statute's sectionList}
+        self.bundleTimes = {} #name -> modification time of the bundle file when the statute was loaded
+        self.pageCache = PageCache(cacheSize)
+        self.checkInterval = checkInterval
+        self.lastCheck = time.time()
+        self.lock = threading.RLock()
+        self.requestCount = 0
+        self.reloadCount = 0
+        for name in self.names: self.load(name)
+        return
+    def getBundleTime(self,name):
+        fname = self.statuteIndex.getStatuteData(name).getBundleName()
+        if not os.path.exists(fname): return None
+        return os.path.getmtime(fname)
+    def load(self,name):
+        """Loads (or reloads) the named statute, processing it if there is no up-to-date snapshot."""
+        bundleTime = self.getBundleTime(name)
+        self.statuteIndex.getStatuteData(name).clearBundle()
+        statute = self.statuteIndex.getProcessedStatute(name)
+        self.statutes[name] = statute
+        self.sectionPositions[name] = dict((sectionItem.getSectionLabel()[0].getIDString(),n) for n, sectionItem in enumerate(statute.sectionList))
+        self.bundleTimes[name] = bundleTime
+        return
+    def getDependents(self,names):
+        """Returns the loaded statutes, other than those in names, whose "Act" or "Regulations" is one of names (and so have links resolved against them when processed)."""
+        dependents = []
+        for name in self.names:
+            if name in names: continue
+            statuteData = self.statuteIndex.getStatuteData(name)
+            if statuteData.getAct() in names or statuteData.getReg() in names: dependents.append(name)
+            pass
+        return dependents
+    def reload(self,name):
+        """Reloads the named statute (see load), returning True if it was reloaded.  If it cannot be (e.g., its bundle is only partly fetched), the error is reported and the statute as previously loaded is kept, to be tried again at the next check."""
+        try: self.load(name)
+        except Exception, e:
+            showError("Could not reload statute [" + name + "]: " + str(e),header="LOADING")
+            self.statutes[name].setIndices() #in case processing the new version replaced them
+            return False
+        return True
+    def checkBundles(self):
+        """Reloads any statute whose bundle file has changed since it was loaded, along with the statutes whose Act or Regulations it is, and then empties the page cache (as pages also show citations from other statutes).  Returns the names of the statutes reloaded."""
+        try:
+            changed = [name for name in self.names if self.getBundleTime(name) != self.bundleTimes[name]]
+            reloaded = [name for name in changed if self.reload(name)] #reloaded first, so that dependents are processed against the new version
+            reloaded += [name for name in self.getDependents(reloaded) if self.reload(name)]
+            if len(reloaded) > 0:
+                self.pageCache.clear()
+                self.reloadCount += len(reloaded)
+                pass
+            return reloaded
+        finally: self.lastCheck = time.time() #even if the check failed, so that it is not repeated for every request
+    def startRequest(self):
+        """Called (with the lock held) before each request is answered."""
+        self.requestCount += 1
+        if time.time() - self.lastCheck >= self.checkInterval: self.checkBundles()
+        return
+    def getStatute(self,name):
+        if name not in self.statutes: raise StatuteServiceException("Unknown statute [" + str(name) + "]")
+        return self.statutes[name]
+    def getSectionPage(self,name,label):
+        """Returns the (encoded) page for the top-level section label of the named statute, or None if there is no such section."""
+        with self.lock:
+            self.startRequest()
+            statute = self.getStatute(name)
+            page = self.pageCache.get((name,label))
+            if page is not None: return page
+            position = self.sectionPositions[name].get(label)
+            if position is None: return None
+            capture = PageCapture()
+            statute.renderSectionPageAt(position,pageQueue=capture)
+            page, = capture.pages.values()
+            self.pageCache.put((name,label),page)
+            return page
+    def getPinpointDict(self,name,sL):
+        """Returns a description of sL in the named statute, for a JSON response."""
+        pin = self.statuteIndex.getStatuteData(name).getPinpoint(sL)
+        return {"statute": name, "label": sL.getIDString(), "page": pin.getPage(), "anchor": pin.getAnchor()}
+    def resolve(self,name,label,hint=None):
+        """Returns a description (see getPinpointDict) of the section label given by the string label in the named statute, looking within the section label string hint as getSLFromString does, or None if it is not found."""
+        with self.lock:
+            self.startRequest()
+            self.getStatute(name)
+            statuteData = self.statuteIndex.getStatuteData(name)
+            locationSL = None
+            if hint is not None:
+                locationSL = statuteData.getSLFromString(hint)
+                if locationSL is None: return None
+                pass
+            sL = statuteData.getSLFromString(label,locationSL=locationSL)
+            if sL is None: return None
+            return self.getPinpointDict(name,sL)
+    def getCitingSections(self,name,label):
+        """Returns descriptions (see getPinpointDict) of the sections of every loaded statute that cite the section label string label of the named statute, or None if there is no such section."""
+        with self.lock:
+            self.startRequest()
+            self.getStatute(name)
+            targetSL = self.statuteIndex.getStatuteData(name).getSLFromString(label)
+            if targetSL is None: return None
+            citing = []
+            for sourceName in self.names:
+                for sL in self.statuteIndex.getStatuteData(sourceName).getLinksToSL(targetSL=targetSL,statuteName=name): citing.append(self.getPinpointDict(sourceName,sL))
+                pass
+            return citing
+    def getStats(self):
+        with self.lock:
+            return {"statutes": self.names, "requests": self.requestCount, "reloads": self.reloadCount,
+                    "cachedPages": len(self.pageCache), "cacheHits": self.pageCache.hits, "cacheMisses": self.pageCache.misses}
+    pass
+
+class ServiceRequestHandler(LocalServer.LocalRequestHandler):
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        query = dict((key,values[0]) for key, values in urlparse.parse_qs(url.query).iteritems())
+        service = self.server.service
+        try:
+            if url.path == "/stats": self.sendJSON(service.getStats()); return
+            if "statute" not in query or "label" not in query: self.send_error(400); return
+            if url.path == "/section": page = service.getSectionPage(query["statute"],query["label"]); contentType = "text/html; charset=utf-8"
+            elif url.path == "/resolve": page = service.resolve(query["statute"],query["label"],query.get("hint")); contentType = None
+            elif url.path == "/citing": page = service.getCitingSections(query["statute"],query["label"]); contentType = None
+            else: self.send_error(404); return
+        except StatuteServiceException: self.send_error(404); return
+        except Exception, e: showError("Could not answer request [" + self.path + "]: " + str(e),header="SERVICE"); self.send_error(500); return
+        if page is None: self.send_error(404)
+        elif contentType is None: self.sendJSON(page)
+        else: self.sendData(page,contentType)
+        return
+    def sendJSON(self,value):
+        self.sendData(json.dumps(value),"application/json")
+        return
+    pass
+
+class ServiceServer(LocalServer.LocalServer):
+    """HTTP server (on the local interface only) for a StatuteService.  If port is 0, a free port is chosen (see getPort)."""
+    def __init__(self,service,port=0,verbose=False):
+        LocalServer.LocalServer.__init__(self,ServiceRequestHandler,port=port,verbose=verbose)
+        self.service = service
+        return
+    def getURL(self): return "http://127.0.0.1:" + str(self.getPort())
+    pass
+
+if __name__ == "__main__":
+    port = 8080
+    if len(sys.argv) > 1: port = int(sys.argv[1])
+    names = sys.argv[2:] or None
+    start = time.time()
+    service = StatuteService(names=names)
+    print("Loaded %d statutes in %.2fs" % (len(service.names), time.time() - start))
+    server = ServiceServer(service,port=port,verbose=True)
+    print("Serving at " + server.getURL())
+    server.serve_forever()
@@ -0,0 +1,63 @@
+# Copyright (C) 2022  Ian Caines
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark of statute bundle storage, comparing bundles with uncompressed and zlib-compressed XML.
+
+For each statute with a bundle in STATUTEDIR, the bundle is stored both ways in a temporary directory, and the size of each file is reported, along with the time to read the XML and the time to read and parse it (feeding the parser as the XML is decompressed)."""
+
+import sys, os, time, tempfile, shutil
+import StatuteIndex, StatuteFetch, XMLStatParse
+
+def timeIt(fn, repeat):
+    """Returns the best time over repeat runs of fn."""
+    best = None
+    for n in xrange(repeat):
+        start = time.time()
+        fn()
+        elapsed = time.time() - start
+        if best is None or elapsed < best: best = elapsed
+        pass
+    return best
+
+def parseBundle(fname):
+    p = XMLStatParse.XMLStatuteParser()
+    for data in StatuteFetch.iterStatuteXML(fname): p.feed(data)
+    return p.getTree()
+
+def benchmark(names=None, repeat=5):
+    si = StatuteIndex.StatuteIndex()
+    if names is None: names = si.getStatuteList()
+    tempDir = tempfile.mkdtemp()
+    print("%-12s %-6s %10s %12s %12s" % ("statute", "format", "size(b)", "read(s)", "parse(s)"))
+    try:
+        for name in names:
+            bundleName = si.getStatuteData(name).getBundleName()
+            if not os.path.exists(bundleName): continue
+            sdict = StatuteFetch.openStatute(bundleName)
+            for label, compression in [("plain",StatuteFetch.NOCOMPRESSION), ("zlib",StatuteFetch.ZLIBCOMPRESSION)]:
+                fname = os.path.join(tempDir, name + "-" + label + ".bundle")
+                StatuteFetch.storeStatute(fname,sdict=sdict,compression=compression)
+                read = timeIt(lambda: StatuteFetch.openStatuteXML(fname), repeat)
+                parse = timeIt(lambda: parseBundle(fname), repeat)
+                print("%-12s %-6s %10d %12.5f %12.5f" % (name, label, os.path.getsize(fname), read, parse))
+                pass
+            pass
+    finally:
+        shutil.rmtree(tempDir)
+    return
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1: benchmark(names=sys.argv[1:])
+    else: benchmark()
@@ -0,0 +1,61 @@
+# Copyright (C) 2022  Ian Caines
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark of loading statute index files, comparing the StatuteIndexFile format with the pickle of (sLDict, sectionNameDict, linkDict) that used to be stored.
+
+For each statute with an index file in STATUTEDATADIR (i.e., that has been processed), reports the size of each format, the time to unpickle the indices, and the time to open the index file and decode just the sectionNameDict, or all the indices."""
+
+import sys, os, time, pickle
+import StatuteIndex, StatuteIndexFile
+
+def timeIt(fn, repeat):
+    """Returns the best time over repeat runs of fn."""
+    best = None
+    for n in xrange(repeat):
+        start = time.time()
+        fn()
+        elapsed = time.time() - start
+        if best is None or elapsed < best: best = elapsed
+        pass
+    return best
+
+def loadNames(fname):
+    StatuteIndexFile.IndexFile(fname).getSectionNameDict()
+    return
+
+def loadAll(fname):
+    indexFile = StatuteIndexFile.IndexFile(fname)
+    indexFile.getSLDict(); indexFile.getSectionNameDict(); indexFile.getLinkDict()
+    return
+
+def benchmark(names=None, repeat=5):
+    si = StatuteIndex.StatuteIndex()
+    if names is None: names = si.getStatuteList()
+    print("%-12s %10s %10s %12s %12s %12s" % ("statute", "pickle(b)", "index(b)", "unpickle(s)", "names(s)", "all(s)"))
+    for name in names:
+        fname = si.getStatuteData(name).getIndexName()
+        if not os.path.exists(fname): continue
+        indexFile = StatuteIndexFile.IndexFile(fname)
+        pickled = pickle.dumps((indexFile.getSLDict(),indexFile.getSectionNameDict(),indexFile.getLinkDict())) #same protocol as the old storeIndices
+        unpickle = timeIt(lambda: pickle.loads(pickled), repeat)
+        nameTime = timeIt(lambda: loadNames(fname), repeat)
+        full = timeIt(lambda: loadAll(fname), repeat)
+        print("%-12s %10d %10d %12.5f %12.5f %12.5f" % (name, len(pickled), os.path.getsize(fname), unpickle, nameTime, full))
+        pass
+    return
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1: benchmark(names=sys.argv[1:])
+    else: benchmark()
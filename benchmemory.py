@@ -0,0 +1,67 @@
+# Copyright (C) 2022  Ian Caines
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark of the peak memory use of parsing and processing statutes, with and without lean mode (see Statute.Statute).
+
+Each statute is parsed and processed (and, with -r, rendered) in a fresh process for each mode, and the peak resident set size of that process is reported.  The baseline is the peak size of a process that has only loaded the modules and the StatuteIndex.
+
+Usage: python benchmemory.py [-r] [statute names]
+(by default, every statute in the index)"""
+
+import sys, subprocess, resource
+import StatuteIndex
+
+def peakRSS():
+    """Returns the peak resident set size of this process, in KB (as reported by Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def runChild(name, mode, render):
+    """Processes the named statute in this process, and prints the peak resident set size.  Mode is "base", "full" or "lean"."""
+    si = StatuteIndex.StatuteIndex()
+    if mode != "base":
+        st = si.getStatute(name, lean=(mode == "lean"))
+        st.doProcess()
+        if render: st.renderPages()
+        pass
+    print(peakRSS())
+    return
+
+def measure(name, mode, render):
+    """Returns the peak resident set size (in KB) of a process processing the named statute in the given mode."""
+    args = [sys.executable, __file__, "--child", mode, name]
+    if render: args.append("-r")
+    out = subprocess.Popen(args, stdout=subprocess.PIPE).communicate()[0]
+    return int(out.split()[-1])
+
+def benchmark(names=None, render=False):
+    si = StatuteIndex.StatuteIndex()
+    if names is None: names = si.getStatuteList()
+    print("%-12s %10s %10s %10s %10s" % ("statute", "base(KB)", "full(KB)", "lean(KB)", "saved(%)"))
+    for name in names:
+        base = measure(name, "base", render)
+        full = measure(name, "full", render)
+        lean = measure(name, "lean", render)
+        saved = 100.0 * (full - lean) / (full - base) if full > base else 0.0 #as a share of the memory used by the statute
+        print("%-12s %10d %10d %10d %10.1f" % (name, base, full, lean, saved))
+        pass
+    return
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    render = "-r" in args
+    if render: args.remove("-r")
+    if len(args) > 0 and args[0] == "--child": runChild(args[2], args[1], render)
+    elif len(args) > 0: benchmark(names=args, render=render)
+    else: benchmark(render=render)
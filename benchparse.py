@@ -0,0 +1,66 @@
+# Copyright (C) 2022  Ian Caines
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark of the langutil parsers on long definition paragraphs, showing how parsing time scales with the length of the text.
+
+For each text length, reports the time for a full SectionReferenceParse and ApplicationParse, and the time to try the label matchers at every candidate position, either by slicing the remaining text (as the parser used to) or by matching at a position in the full text."""
+
+import sys, time
+import langutil, DecoratedText, Statute
+
+#text in the style of a long ITA definition paragraph, repeated to produce longer texts
+clause = u"an amount determined under paragraph 20(1)(a) or subsection 13(21) of the Income Tax Act, chapter 148 of the Revised Statutes of Canada, 1952, in respect of the property described in subparagraph 13(7)(h)(iii) and clauses (x), (y) and (z) of the definition \"arbitrary defined term\" in section 42, and "
+lead = u"The following definitions apply in this section and in subsection 47(3), paragraphs 53(1)(j) and 110(1)(d) and (d.01), this Part and subsections 110(1.1), (1.2), (1.5) and (1.6) and "
+
+def timeIt(fn, repeat):
+    """Returns the best time over repeat runs of fn."""
+    best = None
+    for n in xrange(repeat):
+        start = time.time()
+        fn()
+        elapsed = time.time() - start
+        if best is None or elapsed < best: best = elapsed
+        pass
+    return best
+
+def scanSliced(ltext, positions):
+    for pos in positions:
+        langutil.sectionNamePat.match(ltext[pos:])
+        langutil.labelPat.match(ltext[pos:])
+    return
+
+def scanPositional(ltext, positions):
+    for pos in positions:
+        langutil.sectionNamePat.match(ltext, pos)
+        langutil.labelPat.match(ltext, pos)
+    return
+
+def benchmark(counts=(1, 4, 16, 64, 256), repeat=3):
+    print("%8s %12s %12s %12s %12s" % ("length", "secref(s)", "appparse(s)", "sliced(s)", "positional(s)"))
+    for count in counts:
+        text = lead + clause * count
+        ltext = text.lower()
+        positions = [m.start() for m in langutil.sectionNamePat.finditer(ltext)] #positions at which eatNextLabelSeries would attempt a parse
+        secRef = timeIt(lambda: langutil.SectionReferenceParse(DecoratedText.DecoratedText(parent=Statute.DummyStatute(), text=text)), repeat)
+        appParse = timeIt(lambda: langutil.ApplicationParse(DecoratedText.DecoratedText(parent=Statute.DummyStatute(), text=text)), repeat)
+        sliced = timeIt(lambda: scanSliced(ltext, positions), repeat)
+        positional = timeIt(lambda: scanPositional(ltext, positions), repeat)
+        print("%8d %12.5f %12.5f %12.5f %12.5f" % (len(text), secRef, appParse, sliced, positional))
+        pass
+    return
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1: benchmark(counts=[int(c) for c in sys.argv[1:]])
+    else: benchmark()
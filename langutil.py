@@ -21,8 +21,9 @@ How this will work
 3) Subsequent pass will be needed over all the decorators to "link" them appropriately (assign them to appropriate target instruments, verify that the cited locations in fact exist).
 """
 
-import re
+import re, bisect
 from ErrorReporter import showError
+import ErrorReporter
 import SectionLabelLib
 import DecoratedText
 
@@ -36,6 +37,10 @@ sectionNamePat = re.compile("(?P<type>section|subsection|paragraph|clause|subcla
 wordPat = re.compile(" *(?P<word>[-a-zA-Z]+)\s*")
 punctuationPat = re.compile("(?P<punctuation>\.|,)\s*")
 quotePat = re.compile(" *\"(?P<phrase>[^\"]*)\"")
+spacePat = re.compile("\s*", re.UNICODE) #matches the same characters as unicode.isspace()
+#matches a whole label series (without its location), i.e., a label type and a label, followed by any labels joined by connectors, as would be eaten by TextParse.eatSingleLabelSeries.  The labels are written with [0-9] (which labelPat matches as \d), since the pattern is compiled as unicode so that \s matches the space eaten by eatSpace.
+labelSeriesLabel = "(?:[0-9]+[a-zA-Z]?(?:\.[0-9]+)?(?:\([^\) ]{1,10}\))*|(?:\([^\) ]{1,10}\))+)"
+labelSeriesPat = re.compile("(?P<type>section|subsection|paragraph|clause|subclause)s?\s*" + labelSeriesLabel + "\s*(?:(?:to|and(?: in)?|or|,)(?!\Z)\s*" + labelSeriesLabel + "\s*)*", re.UNICODE)
 
 class Fragment(object):
     """class representing a fragment of text, along with it's position in the parent text block."""
@@ -89,6 +94,11 @@ class Fragment(object):
         """@rtype: bool"""
         return self.seriesStart
     def __len__(self): return len(self.text)
+    def copy(self):
+        """Returns a copy of the fragment, without any target SectionLabel or Pinpoint that has been set.
+        @rtype: Fragment
+        """
+        return Fragment(text=self.text,position=self.position,toConnected=self.toConnected,seriesStart=self.seriesStart)
     def __str__(self):
         if self.isToConnected(): return self.getText() + "<+t>"
         return self.getText()
@@ -227,7 +237,7 @@ class TextParse(object):
         """Advance pointer to the first non-space.
         @rtype: None
         """
-        while self.ptr < len(self.text) and self.text[self.ptr].isspace(): self.ptr += 1
+        self.ptr = spacePat.match(self.text,self.ptr).end()
         return
     def eatWord(self):
         """Eats and returns one word, and advances pointer to end of space following word.
@@ -278,9 +288,9 @@ class TextParse(object):
         return con.group("connector")
     def eatLabelType(self):
         """Eats the string describing a type of label (section, subsection, etc)."""
-        namem = sectionNamePat.match(self.ltext[self.ptr:])
+        namem = sectionNamePat.match(self.ltext,self.ptr)
         if namem is None: return None
-        self.ptr += namem.end()
+        self.ptr = namem.end()
         self.eatSpace()
         return namem.group("type")
 
@@ -288,22 +298,20 @@ class TextParse(object):
         """Eats the string describing a type of label (section, subsection, etc). [new version]
         @rtype: Fragment
         """
-        namem = sectionNamePat.match(self.ltext[self.ptr:])
+        namem = sectionNamePat.match(self.ltext,self.ptr)
         if namem is None: return None
-        oldPtr = self.ptr
-        self.ptr += namem.end()
+        self.ptr = namem.end()
         self.eatSpace()
-        return Fragment(text=namem.group("type"),position=oldPtr)
+        return Fragment(text=namem.group("type"),position=namem.start())
 
     def eatLabel(self):
         """Eats and returns one label (e.g., "12(6)(a)")
         @rtype: Fragment
         """
-        labm = labelPat.match(self.text[self.ptr:])
+        labm = labelPat.match(self.text,self.ptr)
         if labm is None: return None
-        label = self.text[self.ptr:self.ptr + labm.end()] #get corresponding text from the non-lower text, since capitalization is important
-        frag = Fragment(text=label,position=self.ptr)
-        self.ptr += labm.end()
+        frag = Fragment(text=labm.group(0),position=self.ptr) #matched against the non-lower text, since capitalization is important
+        self.ptr = labm.end()
         self.eatSpace()
         return frag
 
@@ -437,13 +445,13 @@ class TextParse(object):
             if nextWord == "Act": self.discardState(); return LabelLocation(local=True)
             #TODO: what is used in place of "this Act" in the regulations?
             elif nextWord in ("section","subsection","paragraph","subparagraph"): self.discardState(); return LabelLocation(local=True)
-            else: showError("Unknown \"of\" type: this " + nextWord, location = self.decoratedText); self.restoreState(); return LabelLocation(local=True)
+            else: showError("Unknown \"of\" type: this %s", location = self.decoratedText, category="unknownOfType", args=(nextWord,)); self.restoreState(); return LabelLocation(local=True)
         elif nextWord == "that":
             nextWord = self.eatWord()
             if nextWord == "Act": self.discardState(); return LabelLocation(actName="that Act")
-            else: showError("Unknown \"of\" type: that " + nextWord, location = self.decoratedText); self.restoreState(); return LabelLocation(local=True)
+            else: showError("Unknown \"of\" type: that %s", location = self.decoratedText, category="unknownOfType", args=(nextWord,)); self.restoreState(); return LabelLocation(local=True)
         elif nextWord != "the":
-            showError("Unknown \"of\" type: " + nextWord, location = self.decoratedText)
+            showError("Unknown \"of\" type: %s", location = self.decoratedText, category="unknownOfType", args=(nextWord,))
             self.restoreState(); return LabelLocation(local=True)
             pass
         #At this point, we have found the text "of the"
@@ -473,7 +481,7 @@ class TextParse(object):
         #TODO: add code to handle references to "Income Tax Act, chapter 148 of the Revised Statutes of Canada, 1952"
         #TODO: references of the "paragraphs (f) and (h) of the description of B in that definition"
         #TODO: paragraphs (a) to (d), (f) and (g) of the definition "qualified investment" in section 204
-        showError("Unknown \"of\" type: no closing \"Act\": " + str(actWords), location = self.decoratedText)
+        showError("Unknown \"of\" type: no closing \"Act\": %s", location = self.decoratedText, category="unknownOfType", args=(actWords,))
         self.restoreState()
         return LabelLocation(local=True)
 
@@ -651,8 +659,17 @@ class ApplicationParse(TextParse):
     initialPat = re.compile("^in|apply in|for the purposes? of")
     initialPatAlt = re.compile(", in") #e.g., 18(5)
     thisPat = re.compile("this (?P<thisType>[a-z]+)")
-    def __init__(self, decoratedText):
+    def __init__(self, decoratedText, parsed=None):
+        """If parsed is given, it holds the results of parsing the same text, and they are copied rather than parsing the text again.
+        @type decoratedText: DecoratedText.DecoratedText
+        @type parsed: ParsedApplication
+        """
         TextParse.__init__(self,decoratedText)
+        if parsed is not None:
+            self.thisList = [frag.copy() for frag in parsed.thisList]
+            self.sectionDict = dict((loc, [frag.copy() for frag in labelList]) for loc, labelList in parsed.sectionDict.iteritems())
+            self.definitionRefList = [(loc, [frag.copy() for frag in labelList]) for loc, labelList in parsed.definitionRefList]
+            return
         self.thisList = [] #list of areas that are referred to as "this", such as "this section" or "this part"
         self.sectionDict = {}
         self.definitionRefList = [] #contains a list of tuples (definition location, list of labels)
@@ -671,12 +688,12 @@ class ApplicationParse(TextParse):
         return m.group(0)
     def eatThis(self):
         """Eats the word "this" and the type of item "this" is referring to (section, division, etc.)"""
-        m = ApplicationParse.thisPat.match(self.ltext[self.ptr:])
+        m = ApplicationParse.thisPat.match(self.ltext,self.ptr)
         if m is None: return None
-        self.ptr += m.end()
+        self.ptr = m.end()
         self.eatSpace()
         if m.group("thisType") not in ["section","act","subsection","part","division","subdivision"]: showError("Unknown \"thisType\": " + m.group("thisType"),location=self)
-        return Fragment(m.group("thisType"),self.ptr+5) #fragment only includes the part of the this-reference after "this"
+        return Fragment(m.group("thisType"),m.start("thisType")) #fragment only includes the part of the this-reference after "this"
     def eatApplicationRange(self):
         """Eats a series of "this" references and section label lists. Returns a tuple (list of section label fragments, list of this type fragments)"""
         while True:
@@ -695,7 +712,7 @@ class ApplicationParse(TextParse):
                 else: raise LangUtilException("eatApplicationRange -- should not get here in code.")
             else: #look for a this block
                 thisFrag = self.eatThis()
-                if thisFrag is None: showError("Could not find label list or this in expected spot in application language.",location=self.decoratedText); break
+                if thisFrag is None: showError("Could not find label list or this in expected spot in application language.",location=self.decoratedText,category="applicationLanguage"); break
                 else: self.thisList.append(thisFrag)
             con = self.eatConnector()
             if con is None: break
@@ -744,8 +761,9 @@ class ApplicationParse(TextParse):
                     elif area == "subdivision": curSegment = curSegment.getSubdivision()
                     if curSegment is None: showError("Could not find current segment [" + area + "] for: " + str(localLoc), location = self.decoratedText)
                     else: #if we found a segment
-                        contents = segData.segmentContents[curSegment]
-                        intervalList.append(SectionLabelLib.SectionLabelInterval(sectionData=sdata,sLList=contents))
+                        interval = segData.getSegmentInterval(curSegment,sectionData=sdata)
+                        if interval is None: interval = SectionLabelLib.SectionLabelInterval(sectionData=sdata,sLList=[]) #segment without any sections gives an empty interval
+                        intervalList.append(interval)
                     pass
                 else: showError("Unknown \"this\" type: " + area, location=self.decoratedText)
                 pass
@@ -776,6 +794,41 @@ class ApplicationParse(TextParse):
         if len(nextSLList) > 0: nextInterval = SectionLabelLib.SectionLabelInterval(sectionData=sdata, sLList=nextSLList); intervalList.append(nextInterval)
         return SectionLabelLib.SectionLabelCollection(sectionData=sdata,intervalList=intervalList)
 
+class ParsedApplication(object):
+    """The results of an ApplicationParse that do not depend on where the text appears: copies of its fragments (without target SectionLabels or Pinpoints) and its LabelLocations.  Unlike the ApplicationParse, it holds no DecoratedText, so caching it does not keep the Statute the text came from alive."""
+    def __init__(self,appParse):
+        """
+        @type appParse: ApplicationParse
+        """
+        self.thisList = [frag.copy() for frag in appParse.thisList]
+        self.sectionDict = dict((loc, [frag.copy() for frag in labelList]) for loc, labelList in appParse.sectionDict.iteritems())
+        self.definitionRefList = [(loc, [frag.copy() for frag in labelList]) for loc, labelList in appParse.definitionRefList]
+        return
+    pass
+
+class ApplicationParseCache(object):
+    """Cache of ApplicationParse results, keyed by the exact text parsed.  The parse itself depends only on the text, so the cached results (a ParsedApplication) are copied into an ApplicationParse for a new DecoratedText, and only the resolution to SectionLabels (getSectionLabelCollection) is done again.  Parses that showed warnings are not cached, so that the warnings are shown again for each location."""
+    def __init__(self):
+        self.parses = {} #cached ParsedApplication objects, indexed by text
+        self.hits = 0
+        self.misses = 0
+        return
+    def getParse(self,decoratedText):
+        """Returns an ApplicationParse for decoratedText, copied from the cache if the same text has been parsed before.
+        @type decoratedText: DecoratedText.DecoratedText
+        @rtype: ApplicationParse
+        """
+        text = decoratedText.getText()
+        if text in self.parses:
+            self.hits += 1
+            return ApplicationParse(decoratedText,parsed=self.parses[text])
+        self.misses += 1
+        errorCount = ErrorReporter.errorCount
+        appParse = ApplicationParse(decoratedText)
+        if ErrorReporter.errorCount == errorCount: self.parses[text] = ParsedApplication(appParse)
+        return appParse
+
+applicationParseCache = ApplicationParseCache() #cache shared by all the Statutes processed in a run
 
 #TODO: need a function that advances us to the start of the next Passage point (starting section, subsection, etc... the value, the description, the definition, others?)
 
@@ -1115,6 +1168,30 @@ class SectionReferenceParse(TextParse):
         self.definitionRefList = []
         self.eatAllSectionReferences()
         return
+    def eatSingleLabelSeries(self):
+        """Same as TextParse.eatSingleLabelSeries, but the label type and the labels joined by connectors are matched in one go by labelSeriesPat, and the labels are then picked out of the match with labelPat (only spaces and connectors separate them)."""
+        m = labelSeriesPat.match(self.ltext,self.ptr)
+        if m is None: return None, None
+        labelList = []
+        prevEnd = None
+        for labm in labelPat.finditer(self.text,m.end("type"),m.end()): #matched against the non-lower text, since capitalization is important
+            frag = Fragment(text=labm.group(0),position=labm.start())
+            if prevEnd is not None and self.ltext[prevEnd:labm.start()].strip() == "to": frag.setToConnected(True)
+            labelList.append(frag)
+            prevEnd = labm.end()
+            pass
+        self.ptr = m.end()
+        location = self.eatActLocation()
+        labelList[0].setSeriesStart()
+        return location, labelList
+    def eatNextLabelSeries(self):
+        """Eats to the start of a labelSeries, and then eats and returns the series.  Uses labelSeriesPat to find the start, so that only positions where a series can be eaten are tried.  If no valid label series found, advances point to end of string and returns None, None."""
+        namem = labelSeriesPat.search(self.ltext, self.ptr)
+        if namem is None:
+            self.ptr = len(self.text)
+            return None, None
+        self.ptr = namem.start()
+        return self.eatLabelSeries()
     def eatAllSectionReferences(self):
         """Eat all the label series in the text, and store in sectionDict dictionary."""
         loc, labList = self.eatNextLabelSeries()
@@ -1175,6 +1252,27 @@ class SectionReferenceParse(TextParse):
         for loc, labList in self.definitionRefList: print(str(loc) + " : " + str([str(c) for c in labList]))
         return
 
+def flagReferenceTexts(texts):
+    """Returns a list of flags, one for each of the texts, which are True if the text contains a label type (section, subsection, etc.).  SectionReferenceParse finds nothing in the other texts, so it need not be run on them.  The texts are joined and scanned with sectionNamePat in one pass, jumping to the next text after each hit.
+    @type texts: list of unicode
+    @rtype: list of bool
+    """
+    offsets = [] #position of each text in the joined text
+    pos = 0
+    for text in texts:
+        offsets.append(pos)
+        pos += len(text) + 1
+        pass
+    joined = u"\x00".join(texts).lower()
+    flags = [False] * len(texts)
+    m = sectionNamePat.search(joined)
+    while m is not None:
+        n = bisect.bisect_right(offsets,m.start()) - 1
+        flags[n] = True
+        if n+1 == len(texts): break
+        m = sectionNamePat.search(joined,offsets[n+1])
+        pass
+    return flags
 
 if __name__ == "__main__":
     #various tests for pattern matching
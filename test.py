@@ -14,7 +14,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import os, sys
-import StatuteIndex
+import StatuteIndex, langutil, RenderContext, PageArchive, ErrorReporter
 import Constants
 
 #Script to run the parser on every statute provided in the Statutes subdirectory, as a test.
@@ -25,7 +25,10 @@ statList=["ITA"]
 #statList=["IT Reg"]
 #statList=["ITA", "IT Reg"]
 
+ErrorReporter.collector = ErrorReporter.ErrorCollector() #warnings are written out, with counts by category, at the end of the run
 si = StatuteIndex.StatuteIndex()
+if Constants.PAGEARCHIVEFILE is not None: pageQueue = PageArchive.PageArchive(Constants.PAGEARCHIVEFILE) #store pages in a single archive
+else: pageQueue = RenderContext.PageQueue() #write pages on a background thread
 
 
 for statName in statList: #parse each file in turn
@@ -37,6 +40,16 @@ for statName in statList: #parse each file in turn
     print("=" * len(s))
     st = si.getStatute(name=statName)
     st.doProcess()
-    st.renderPages()
+    parsed, total = st.referenceParseCounts
+    if total > 0: print("Reference parsing skipped for %d of %d text blocks (%.1f%%)" % (total-parsed, total, 100.0*(total-parsed)/total))
+    st.renderPages(pageQueue)
+    print("Rendering stalled for %.2fs waiting for pages to be written" % st.pageWriteStall)
     pass
 
+cache = langutil.applicationParseCache
+print("Application parse cache: %d hits, %d misses" % (cache.hits, cache.misses))
+pageQueue.finish()
+print("Page writer: %d pages, %.2fs writing" % (pageQueue.pageCount, pageQueue.writeTime))
+cache = RenderContext.HTMLContext.anchorCache
+print("Anchor encoding cache: %d hits, %d misses" % (cache.hits, cache.misses))
+ErrorReporter.collector.flush(Constants.ERRORLOGFILE)